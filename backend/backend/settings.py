@@ -51,7 +51,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'whoosh',
     'haystack',
-    'map_backend',
+    'map_backend.apps.MapBackendConfig',
     'corsheaders',
 ]
 
@@ -126,8 +126,75 @@ HAYSTACK_CONNECTIONS = {
     }
 }
 
-# This makes it so the index should automatically update when things are added to DB
-HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.RealtimeSignalProcessor'
+# This makes it so the index is updated when things are added to DB,
+# in batches once their transaction commits, see map_backend/indexing.py
+HAYSTACK_SIGNAL_PROCESSOR = 'map_backend.indexing.QueuedSignalProcessor'
+# objects indexed with one commit to the index
+SEARCH_INDEX_BATCH_SIZE = 1000
+# index queued objects as soon as their transaction commits, otherwise the drain_index_queue command does it
+SEARCH_INDEX_DRAIN_ON_COMMIT = True
+
+# Search
+# "haystack" searches the index above, "memory" an index each worker builds from the course table (see search.py),
+# "database" the full-text index of the database (Postgres tsvector and pg_trgm, or SQLite FTS5, see db_search.py)
+SEARCH_ENGINE = os.environ.get("SEARCH_ENGINE", "haystack")
+# most results in one Search response, and the default limit
+SEARCH_MAX_RESULTS = 50
+
+# Search cache
+# (course_id, score) hits of the Haystack searches kept by each worker for autocomplete, about 120 bytes each,
+# the least recently used searches are dropped past this
+SEARCH_CACHE_SIZE = 20000
+# searches with more hits than this aren't kept, it is also the most hits read from the index on a miss
+SEARCH_CACHE_CANDIDATES = 100
+# seconds a search is kept for
+SEARCH_CACHE_TTL = 60
+
+# Data version
+# seconds a worker may keep using its cached data version before checking the database again
+DATA_VERSION_TTL = 1
+
+# Batch calculation
+# maximum number of selection sets in one SubmitCourseSelectionsBatch request
+BATCH_MAX_SELECTIONS = 1000
+# maximum number of worker processes used by one batch request
+BATCH_MAX_WORKERS = os.cpu_count() or 1
+
+# Evaluation sessions
+# open sessions kept by each worker, the least recently used are closed past this
+EVALUATION_SESSIONS_MAX = 1000
+# most courses a session can hold, as for SubmitCourseSelections
+EVALUATION_SESSION_MAX_COURSES = 15
+
+# Result cache
+# SubmitCourseSelections responses kept by each worker, the least recently used are dropped past this
+RESULT_CACHE_SIZE = 1000
+# seconds a response is kept for
+RESULT_CACHE_TTL = 300
+
+# Course suggestions
+# seconds SuggestCourses may spend trying candidate courses
+SUGGEST_TIME_LIMIT = 0.2
+# most suggestions returned overall and per program
+SUGGEST_MAX_RESULTS = 50
+
+# Audit mode
+# most courses SubmitCourseSelections accepts with "audit": true
+AUDIT_MAX_COURSES = 60
+
+# Prebuilt payloads
+# GetCourseData responses kept (with their compressed variants) by each worker
+PAYLOAD_CACHE_SIZE = 256
+# Cache-Control header of prebuilt responses, clients revalidate with the ETag when it expires
+PAYLOAD_CACHE_CONTROL = "public, max-age=300"
+
+# Course details
+# maximum number of courses in one GetCourseDetails request
+COURSE_DETAILS_MAX_IDS = 500
+
+# Streamed responses
+# courses fetched from the database (and sent) at a time by GetCourseData?stream=1
+COURSE_DATA_CHUNK_SIZE = 2000
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
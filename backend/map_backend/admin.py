@@ -2,7 +2,28 @@ from django.contrib import admin
 from django.forms import TextInput, Textarea
 from django.db.models import TextField
 from .models import Course, CourseList, RequirementGroup, RequirementItem, Program, Calculator
-from .requirement_handler import Parser
+from .requirement_handler import build_group
+from .version import bump_data_version
+from .equations import refresh_equations
+
+class BumpDataVersionMixin:
+    """ Admin edits change the data every worker has cached, see version.py """
+
+    def data_saved(self):
+        bump_data_version()
+        refresh_equations()
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        self.data_saved()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.data_saved()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        self.data_saved()
 
 class RequirementItemInline(admin.TabularInline):
     model = RequirementItem
@@ -10,7 +31,12 @@ class RequirementItemInline(admin.TabularInline):
     extra = 0
     raw_id_fields  = ['req_list']
 
-class RequirementGroupAdmin(admin.ModelAdmin):
+def item_label(item):
+    """ How a requirement item is shown in the admin """
+    check_list = list((item.req_list.courses.all().values_list('code', flat=True)))
+    return f"{item.req_units} Units from {check_list}"
+
+class RequirementGroupAdmin(BumpDataVersionMixin, admin.ModelAdmin):
     model = RequirementGroup
     search_fields = ['desc']
     inlines = [
@@ -28,24 +54,10 @@ class RequirementGroupAdmin(admin.ModelAdmin):
         if len(requirement_items) == 0:
             return ""
 
-        build_requirements = []
-
-        for i, item in enumerate(requirement_items):
-            # We skip the connector for the first item
-            if i != 0:
-                build_requirements.append(item.connector)
-
-            units = item.req_units
-            check_list = list((item.req_list.courses.all().values_list('code', flat=True)))
-            check_list = f"{units} Units from {check_list}"
+        return str(build_group(requirement_items, obj.connector, item_label))
 
-            build_requirements.append(check_list)
 
-        check_list = Parser(build_requirements, not obj.connector).parse()
-        return str(check_list)
-
-
-class CourseListAdmin(admin.ModelAdmin):
+class CourseListAdmin(BumpDataVersionMixin, admin.ModelAdmin):
     filter_horizontal = ["courses"]
     search_fields = ['name', 'courses__code']
     list_display = ['name', 'list_courses']
@@ -59,7 +71,7 @@ class CourseListAdmin(admin.ModelAdmin):
 
         return ", ".join(courses)
 
-class ProgramAdmin(admin.ModelAdmin):
+class ProgramAdmin(BumpDataVersionMixin, admin.ModelAdmin):
     filter_horizontal = ["requirements"]
     formfield_overrides = {
             TextField: {'widget': Textarea(attrs={'rows':4, 'cols':30})},
@@ -73,29 +85,14 @@ class ProgramAdmin(admin.ModelAdmin):
 
         for requirement in requirement_groups:
             requirement_items = requirement.requirementitem_set.all()
-
-            build_requirements = []
-
-            for i, item in enumerate(requirement_items):
-                # We skip the connector for the first item
-                if i != 0:
-                    build_requirements.append(item.connector)
-
-                units = item.req_units
-                check_list = list((item.req_list.courses.all().values_list('code', flat=True)))
-                check_list = f"{units} Units from {check_list}"
-
-                build_requirements.append(check_list)
-
-            check_list = Parser(build_requirements, not requirement.connector).parse()
-            output_requirements.append(str(check_list))
+            output_requirements.append(str(build_group(requirement_items, requirement.connector, item_label)))
 
         return "\n".join(output_requirements)
 
-class CourseAdmin(admin.ModelAdmin):
+class CourseAdmin(BumpDataVersionMixin, admin.ModelAdmin):
     search_fields = ['name', 'code']
 
-class CalculatorAdmin(admin.ModelAdmin):
+class CalculatorAdmin(BumpDataVersionMixin, admin.ModelAdmin):
     filter_horizontal = ["courses", "programs"]
 
 admin.site.register(Course, CourseAdmin)
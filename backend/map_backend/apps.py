@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class MapBackendConfig(AppConfig):
     name = 'map_backend'
+
+    def ready(self):
+        from .signals import connect_signals
+        connect_signals()
@@ -0,0 +1,207 @@
+"""
+In-memory requirement plans and catalogs for the bench_* management commands
+
+Plans are built directly (no database), either as copies of the
+scenarios in tests.py or as random synthetic calculators.
+"""
+import random
+import time
+from .requirement_handler import BinOp, Parser, flatten, normalize
+from .engine import calculate_leaf, all_courses
+from .plans import Leaf, ItemPlan, GroupPlan, ProgramPlan, assemble_plan
+from .catalog import CourseRecord
+
+AND = 0
+OR = 1
+
+# scenarios from tests.py
+#   courses: {course_id: units}
+#   groups: [(group connector, [(item connector, req units, [course ids]), ...]), ...]
+#   selections: selections submitted by the test
+FIXTURES = {
+        "TestCalculation": ({1: 3}, [(AND, [(None, 3, [1])])], [[1]]),
+        "Test0PercentProgram": ({1: 3, 5: 3}, [(AND, [(None, 3, [5])])], [[1]]),
+        "Test50PercentProgram": ({1: 3, 5: 3}, [(AND, [(None, 6, [1, 5])])], [[1]]),
+        "Test2ReqGroupProgram": ({1: 3, 5: 3}, [(AND, [(None, 3, [1])]), (AND, [(None, 3, [5])])], [[1, 5]]),
+        "Test2ReqItemProgramAND": ({1: 3, 5: 3}, [(AND, [(None, 3, [1]), (AND, 3, [5])])], [[1, 5]]),
+        "Test2ReqItemProgramAND50": ({1: 3, 5: 3}, [(AND, [(None, 3, [1]), (AND, 3, [5])])], [[1]]),
+        "Test2ReqItemProgramOR": ({1: 3, 5: 3}, [(AND, [(None, 3, [1]), (OR, 3, [5])])], [[1]]),
+        "TestSameCourseCannotBeUsed": ({1: 3}, [(AND, [(None, 3, [1])]), (AND, [(None, 3, [1])])], [[1]]),
+        "TestSelectionOrderIsKept": ({1: 3, 5: 3}, [(AND, [(None, 3, [1, 5])]), (AND, [(None, 3, [1, 5])])], [[5, 1]]),
+}
+
+
+def build_plan(courses, programs):
+    """
+    Builds a CalculatorPlan
+    courses is {course_id: units}, programs is a list of groups as in FIXTURES
+    """
+    index = {course_id: bit for bit, course_id in enumerate(courses)}
+    compiled = []
+
+    for program_id, groups in enumerate(programs, 1):
+        compiled_groups = []
+
+        for connector, items in groups:
+            build_requirements = []
+            group_items = []
+            for i, (item_connector, units, members) in enumerate(items):
+                if i != 0:
+                    build_requirements.append(item_connector)
+                mask = 0
+                for course_id in members:
+                    mask |= 1 << index[course_id]
+                build_requirements.append(Leaf(units, mask))
+                group_items.append(ItemPlan(i, units, mask))
+
+            tree = normalize(flatten(Parser(build_requirements, not connector).parse()))
+            compiled_groups.append(GroupPlan(tree, "", all_courses(tree), tuple(group_items)))
+
+        compiled.append(ProgramPlan(program_id, "Program {}".format(program_id), "", tuple(compiled_groups), ()))
+
+    return assemble_plan(1, compiled, [(course_id, "COURSE {}".format(course_id), units) for course_id, units in courses.items()])
+
+
+def fixture_plans():
+    """ (name, plan, selections) for every scenario of FIXTURES """
+    for name, (courses, groups, selections) in FIXTURES.items():
+        yield name, build_plan(courses, [groups]), selections
+
+
+def synthetic_groups(rng, course_ids, groups, items, list_size):
+    """ Random requirement groups with mixed connectors and overlapping lists """
+    result = []
+    for g in range(groups):
+        group_items = []
+        for i in range(items):
+            connector = None if i == 0 else rng.choice((AND, OR))
+            units = rng.choice((3, 3, 6, 6, 9, 12))
+            group_items.append((connector, units, rng.sample(course_ids, min(list_size, len(course_ids)))))
+        result.append((rng.choice((AND, OR)), group_items))
+    return result
+
+
+def synthetic_plan(programs=50, groups=3, items=4, list_size=20, courses=400, seed=0):
+    """ A random calculator, all courses are 3 units except every tenth which is 6 """
+    rng = random.Random(seed)
+    course_units = {course_id: 6 if course_id % 10 == 0 else 3 for course_id in range(1, courses + 1)}
+    course_ids = list(course_units)
+
+    return build_plan(course_units, [synthetic_groups(rng, course_ids, groups, items, list_size) for p in range(programs)])
+
+
+def synthetic_selections(plan, count=20, size=15, seed=0):
+    """ Random selections drawn from the courses a plan refers to """
+    rng = random.Random(seed)
+    course_ids = list(plan.index)
+    return [rng.sample(course_ids, min(size, len(course_ids))) for i in range(count)]
+
+
+def synthetic_tokens(rng, items, connectors, courses, list_size=10, empty=0.1):
+    """
+    Parser input for one large requirement group
+    connectors are drawn from for every item after the first, some lists are empty
+    and some items repeat the one before them
+    """
+    tokens = []
+    for i in range(items):
+        if i != 0:
+            tokens.append(rng.choice(connectors))
+        if i != 0 and rng.random() < 0.1:
+            tokens.append(tokens[-2])
+        elif rng.random() < empty:
+            tokens.append(Leaf(rng.choice((3, 6)), 0))
+        else:
+            mask = 0
+            for bit in rng.sample(range(courses), list_size):
+                mask |= 1 << bit
+            tokens.append(Leaf(rng.choice((3, 6, 9)), mask))
+    return tokens
+
+
+# words course names are made of
+NAME_WORDS = ("Introduction", "Advanced", "Principles", "Topics", "Calculus", "Chemistry", "Physics", "Biology",
+        "Programming", "Systems", "Analysis", "Design", "Theory", "Methods", "Organic", "Linear", "Algebra",
+        "Statistics", "Economics", "History", "Literature", "Engineering", "Materials", "Ethics", "Psychology",
+        "Data", "Structures", "Networks", "Security", "Cell", "Molecular", "Genetics", "Ecology", "Music", "Art",
+        "for", "and", "of", "in", "Science", "Society", "Research", "Seminar", "Laboratory", "Applied")
+
+
+def synthetic_courses(count=10000, subjects=200, vocabulary=3000, seed=0):
+    """
+    Random CourseRecords with codes like COMPSCI 1MD3 and names of 2 to 5 words
+    Names mix the common words of NAME_WORDS with a vocabulary of made up ones
+    """
+    rng = random.Random(seed)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    subject_codes = set()
+    while len(subject_codes) < subjects:
+        subject_codes.add("".join(rng.choice(letters) for i in range(rng.randint(3, 8))))
+    subject_codes = sorted(subject_codes)
+
+    syllables = [consonant + vowel for consonant in "bcdfghjklmnprstvwz" for vowel in "aeiou"]
+    made_up = sorted({"".join(rng.choice(syllables) for i in range(rng.randint(2, 5))).capitalize() for w in range(vocabulary)})
+
+    courses = []
+    codes = set()
+    while len(courses) < count:
+        code = "{} {}{}{}".format(rng.choice(subject_codes), rng.randint(1, 4), "".join(rng.sample(letters + "0123456789", 2)), rng.choice("0369"))
+        if code in codes:
+            continue
+        codes.add(code)
+        name = " ".join(rng.choice(NAME_WORDS) if rng.random() < 0.4 else rng.choice(made_up) for i in range(rng.randint(2, 5)))
+        courses.append(CourseRecord(len(courses) + 1, code, name, 3, code.split()[0], True, True, False, False))
+
+    return courses
+
+
+def synthetic_queries(courses, count=500, seed=0):
+    """ What users type: code prefixes with and without spaces, name prefixes and misspelt names """
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        course = rng.choice(courses)
+        kind = i % 4
+        if kind == 0:
+            queries.append(course.code[:rng.randint(2, len(course.code))])
+        elif kind == 1:
+            queries.append(course.code.replace(" ", "")[:rng.randint(3, len(course.code) - 1)].lower())
+        elif kind == 2:
+            queries.append(course.name[:rng.randint(2, min(20, len(course.name)))])
+        else:
+            name = list(course.name[:12])
+            name[rng.randrange(len(name))] = rng.choice("aeiou")
+            queries.append("".join(name))
+    return queries
+
+
+def calculate_binop(tree, remaining, selection):
+    """ engine.calculate as it was for Parser trees, recursing into both sides of every BinOp """
+    if not isinstance(tree, BinOp):
+        return calculate_leaf(tree, remaining, selection)
+
+    if tree.op == AND:
+        left_completed, left_required, left_remaining = calculate_binop(tree.left, remaining, selection)
+        right_completed, right_required, right_remaining = calculate_binop(tree.right, left_remaining, selection)
+        return left_completed + right_completed, left_required + right_required, right_remaining
+
+    left_completed, left_required, left_remaining = calculate_binop(tree.left, remaining, selection)
+    right_completed, right_required, right_remaining = calculate_binop(tree.right, remaining, selection)
+    if left_completed == left_required or (left_required - left_completed) < (right_required - right_completed):
+        return left_completed, left_required, left_remaining
+    return right_completed, right_required, right_remaining
+
+
+def timed(fn, repeat=5):
+    """ Runs fn repeat times, returns the sorted durations in seconds """
+    durations = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return sorted(durations)
+
+
+def percentile(durations, p):
+    """ p-th percentile of sorted durations """
+    return durations[min(len(durations) - 1, int(len(durations) * p / 100))]
@@ -0,0 +1,44 @@
+from collections import namedtuple
+from .models import Course
+from .version import data_version
+
+# Read-only copy of a course, without its description
+CourseRecord = namedtuple('CourseRecord', ['course_id', 'code', 'name', 'units', 'department',
+        'offered_fall', 'offered_winter', 'offered_summer', 'offered_spring'])
+
+# loaded catalog of this worker
+_catalog = None
+
+
+class Catalog:
+    """
+    Every course, loaded once per worker for a data version
+    Descriptions are only loaded the first time one is asked for
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.courses = {record.course_id: record for record in
+                (CourseRecord(*row) for row in Course.objects.values_list(*CourseRecord._fields))}
+        self.descriptions = None
+
+    def get(self, course_id):
+        """ Returns the record of a course, or None """
+        return self.courses.get(course_id)
+
+    def description(self, course_id):
+        if self.descriptions is None:
+            self.descriptions = dict(Course.objects.values_list('course_id', 'desc'))
+        return self.descriptions.get(course_id, "")
+
+
+def get_catalog():
+    """ Returns the course catalog, (re)loading it when the data version changed """
+    global _catalog
+    version = data_version()
+
+    if _catalog is None or _catalog.version != version:
+        _catalog = Catalog(version)
+
+    return _catalog
+
@@ -0,0 +1,73 @@
+from functools import wraps
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from .version import read_data_version, read_search_version
+
+
+def cacheable(response):
+    """ Marks a successful response of a version_conditional view, only those are given validators """
+    response.cacheable = True
+    return response
+
+
+def data_version_conditional(view):
+    """
+    Conditional GETs for a view whose response only depends on the request and the loaded data
+    """
+    return version_conditional(view, read_data_version)
+
+
+def search_version_conditional(view):
+    """
+    Conditional GETs for a view whose response only depends on the request, the loaded data and the search
+    index, see read_search_version
+    """
+    return version_conditional(view, read_search_version)
+
+
+def version_conditional(view, read_version):
+    """
+    Conditional GETs for a view whose responses change with the (stamp, time) read_version returns
+
+    Responses the view marked cacheable get the Last-Modified of the version, and its
+    ETag unless the view set its own (payloads.py hashes the body), so a request with a
+    matching If-None-Match (or an If-Modified-Since not older than the last change) is
+    answered with 304 before the view is called. The ETag is weak as the same version may
+    be sent with different content codings. Errors are sent without validators.
+    Other methods, and requests before data is first loaded, go straight to the view.
+    """
+    @wraps(view)
+    def conditional_view(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return view(request, *args, **kwargs)
+
+        stamp, updated = read_version()
+        if not stamp:
+            return view(request, *args, **kwargs)
+
+        etag = 'W/"{}"'.format(stamp)
+        last_modified = int(updated.timestamp())
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            # an If-Modified-Since alone may match a view with its own ETag, which isn't known here
+            if request.META.get('HTTP_IF_NONE_MATCH'):
+                response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            response["Cache-Control"] = settings.PAYLOAD_CACHE_CONTROL
+            patch_vary_headers(response, ("Accept-Encoding",))
+            return response
+
+        response = view(request, *args, **kwargs)
+        if response.status_code != 200 or not getattr(response, "cacheable", False):
+            return response
+
+        if not response.has_header("ETag"):
+            response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        if not response.has_header("Cache-Control"):
+            response["Cache-Control"] = settings.PAYLOAD_CACHE_CONTROL
+        return response
+
+    return conditional_view
@@ -0,0 +1,68 @@
+from django.db import connection
+from .search import normalize_code, words
+
+# tsvector of a course, the same expression as the GIN index of migration 0005
+POSTGRES_VECTOR = "to_tsvector('simple', code || ' ' || replace(code, ' ', '') || ' ' || name)"
+
+# Postgres: prefix matches of every word (or of the whole code) ranked with ts_rank,
+# names within the pg_trgm similarity threshold match too, so a misspelt name is found
+POSTGRES_SEARCH = """
+    SELECT course_id, ts_rank({vector}, query) + similarity(name, %s) AS score, count(*) OVER () AS total
+    FROM map_backend_course, to_tsquery('simple', %s) AS query
+    WHERE {vector} @@ query OR name %% %s
+    ORDER BY score DESC, code
+    LIMIT %s OFFSET %s
+""".format(vector=POSTGRES_VECTOR)
+
+# SQLite: prefix matches in the FTS5 table ranked with bm25 (lower is better),
+# which can't be called next to a window function so it is in a subquery
+SQLITE_SEARCH = """
+    SELECT rowid, score, count(*) OVER () AS total
+    FROM (SELECT rowid, code, -bm25(map_backend_course_fts) AS score
+          FROM map_backend_course_fts
+          WHERE map_backend_course_fts MATCH %s)
+    ORDER BY score DESC, code
+    LIMIT %s OFFSET %s
+"""
+
+
+def postgres_query(query):
+    """ tsquery of every word as a prefix, or the whole code as one: "(compsci:* & 1md:*) | compsci1md:*" """
+    terms = " & ".join("{}:*".format(word) for word in words(query))
+    return "({}) | {}:*".format(terms, normalize_code(query).lower())
+
+
+def sqlite_query(query):
+    """ FTS5 query of every word as a prefix, or the whole code as one: ("compsci"* AND "1md"*) OR code_key: "compsci1md"* """
+    terms = " AND ".join('"{}"*'.format(word) for word in words(query))
+    return '({}) OR code_key: "{}"*'.format(terms, normalize_code(query).lower())
+
+
+def run_search(query, limit, offset):
+    """ (course_id, score, total) rows of a page """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(POSTGRES_SEARCH, [query, postgres_query(query), query, limit, offset])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(SQLITE_SEARCH, [sqlite_query(query), limit, offset])
+        else:
+            raise NotImplementedError("no full-text search for {}".format(connection.vendor))
+        return cursor.fetchall()
+
+
+def search_courses(query, limit, offset=0):
+    """
+    ([(course_id, score)], total) of the courses matching query, searched by the database
+    Hits are best first, from offset on and at most limit of them
+    """
+    if not words(query):
+        return [], 0
+
+    rows = run_search(query, limit, offset)
+    if not rows and offset:
+        # past the last page, the total comes from the first one
+        total = run_search(query, 1, 0)
+        return [], total[0][2] if total else 0
+
+    total = rows[0][2] if rows else 0
+    return [(course_id, score) for course_id, score, count in rows], total
@@ -0,0 +1,252 @@
+from collections import namedtuple
+from .requirement_handler import Node, leaves
+
+AND = 0
+OR = 1
+
+# Result of checking one program
+#   completed/required are unit totals over every requirement group
+#   fulfilled holds the mask of courses used by each group (in group order)
+ProgramResult = namedtuple('ProgramResult', ['completed', 'required', 'fulfilled'])
+
+
+class Selection:
+    """
+    The courses a user selected, as seen by a compiled CalculatorPlan
+
+    Courses are kept in selection order since the first matching courses
+    are the ones used to satisfy a requirement.
+    Courses that no requirement refers to can never be matched and are dropped.
+    position[bit] is the index of a course in order, so the courses of a mask
+    can be put in selection order without going through the whole selection.
+    """
+
+    def __init__(self, plan, course_ids):
+        self.plan = plan
+        self.order = []
+        self.position = {}
+        self.mask = 0
+
+        for course in course_ids:
+            bit = plan.index.get(course)
+            if bit is not None and not self.mask >> bit & 1:
+                self.position[bit] = len(self.order)
+                self.order.append(bit)
+                self.mask |= 1 << bit
+
+    def added(self, bit):
+        """ This selection with one more course (a bit of the plan), selected last """
+        selection = Selection(self.plan, ())
+        selection.order = self.order + [bit]
+        selection.position = dict(self.position)
+        selection.position[bit] = len(self.order)
+        selection.mask = self.mask | 1 << bit
+        return selection
+
+    def in_order(self, mask):
+        """ Bits of the selected courses in mask, in selection order """
+        bits = []
+        while mask:
+            low = mask & -mask
+            bits.append(low.bit_length() - 1)
+            mask ^= low
+
+        if len(bits) > 1:
+            bits.sort(key=self.position.__getitem__)
+        return bits
+
+    def codes(self, mask):
+        """ Course codes of the courses in mask, in selection order """
+        codes = self.plan.codes
+        return [codes[bit] for bit in self.in_order(mask)]
+
+
+def units_of(mask, units):
+    """ Sums the units of every course in mask """
+    total = 0
+    while mask:
+        low = mask & -mask
+        total += units[low.bit_length() - 1]
+        mask ^= low
+
+    return total
+
+
+def all_courses(tree):
+    """ Mask of every course mentioned in a requirement tree """
+    mask = 0
+    for leaf in leaves(tree):
+        mask |= leaf.mask
+    return mask
+
+
+def min_required(tree):
+    """ Fewest units a requirement tree can ask for, an OR may be satisfied by any of its children """
+    if not isinstance(tree, Node):
+        return tree.units
+    required = [min_required(child) for child in tree.children]
+    return sum(required) if tree.op == AND else min(required)
+
+
+def calculate_leaf(leaf, remaining, selection):
+    """ Checks one requirement item, returns (completed units, required units, remaining courses) """
+    req_units, list_mask = leaf
+    matched = remaining & list_mask
+
+    if not matched:
+        return 0, req_units, remaining
+
+    course_units = selection.plan.units
+    units = 0
+    bits = []
+    mask = matched
+    while mask:
+        low = mask & -mask
+        bit = low.bit_length() - 1
+        bits.append(bit)
+        units += course_units[bit]
+        mask ^= low
+
+    # not enough to satisfy the requirement, every match is used
+    if units < req_units:
+        return units, req_units, remaining & ~matched
+
+    # take courses in selection order until the requirement is exactly met,
+    # only the matched courses are sorted so the cost doesn't grow with the selection
+    if len(bits) > 1:
+        bits.sort(key=selection.position.__getitem__)
+
+    units = req_units
+    used = 0
+    for bit in bits:
+        units -= course_units[bit]
+        used |= 1 << bit
+        if units == 0:
+            break
+
+    return req_units - units, req_units, remaining & ~used
+
+
+def calculate_flat(node, remaining, selection):
+    """ calculate() for a node whose children are all leaves """
+    children = node.children
+    best = calculate_leaf(children[0], remaining, selection)
+
+    if node.op == AND:
+        for child in children[1:]:
+            result = calculate_leaf(child, best[2], selection)
+            best = (best[0] + result[0], best[1] + result[1], result[2])
+    else:
+        for child in children[1:]:
+            if best[0] == best[1]:
+                break
+            result = calculate_leaf(child, remaining, selection)
+            if best[1] - best[0] >= result[1] - result[0]:
+                best = result
+
+    return best
+
+
+def calculate(tree, remaining, selection):
+    """
+    Checks a requirement tree against the remaining (unused) courses
+
+    The children of an AND are checked in order, each with the courses the
+    previous ones left. The children of an OR are all checked against the same
+    courses and folded left to right: the result so far is kept if it is
+    complete or misses fewer units than the next child, otherwise the next
+    child replaces it.
+
+    Returns (completed units, required units, remaining courses)
+    """
+    if not isinstance(tree, Node):
+        return calculate_leaf(tree, remaining, selection)
+    if tree.flat:
+        return calculate_flat(tree, remaining, selection)
+
+    # frames are [node, next child, courses given to the node, result so far]
+    stack = [[tree, 0, remaining, None]]
+
+    while True:
+        frame = stack[-1]
+        node, i, given, best = frame
+        children = node.children
+        is_and = node.op == AND
+
+        while i < len(children):
+            # OR case, a complete result is never replaced
+            if not is_and and best is not None and best[0] == best[1]:
+                i = len(children)
+                continue
+
+            child = children[i]
+            i += 1
+            # an AND passes on what its previous children left
+            courses = best[2] if is_and and best is not None else given
+
+            if not isinstance(child, Node):
+                result = calculate_leaf(child, courses, selection)
+            elif child.flat:
+                result = calculate_flat(child, courses, selection)
+            else:
+                frame[1] = i
+                frame[3] = best
+                stack.append([child, 0, courses, None])
+                break
+
+            if best is None:
+                best = result
+            elif is_and:
+                best = (best[0] + result[0], best[1] + result[1], result[2])
+            elif best[0] != best[1] and best[1] - best[0] >= result[1] - result[0]:
+                # OR case, the earlier result is kept when complete or closer to complete
+                best = result
+        else:
+            # every child was checked, hand the result to the parent
+            stack.pop()
+            if not stack:
+                return best
+
+            result = best
+            frame = stack[-1]
+            best = frame[3]
+            if best is None:
+                best = result
+            elif frame[0].op == AND:
+                best = (best[0] + result[0], best[1] + result[1], result[2])
+            elif best[0] != best[1] and best[1] - best[0] >= result[1] - result[0]:
+                best = result
+            frame[3] = best
+
+
+def touched_programs(plan, selection):
+    """
+    Positions of the programs that refer to a selected course
+    Every other program is at 0%, its result is plan.untouched
+    """
+    touched = set()
+    for bit in selection.order:
+        touched.update(plan.course_programs[bit])
+    return touched
+
+
+def evaluate_program(program, selection):
+    """ Checks every requirement group of a program in order, a course can only be used once """
+    remaining = selection.mask
+    total_completed_courses = total_required_courses = 0
+    fulfilled = []
+
+    for requirement in program.groups:
+        completed_courses, required_courses, left = calculate(requirement.tree, remaining, selection)
+
+        total_completed_courses += completed_courses
+        total_required_courses += required_courses
+        fulfilled.append(remaining & ~left)
+        remaining = left
+
+    return ProgramResult(total_completed_courses, total_required_courses, tuple(fulfilled))
+
+
+def percentage(result):
+    """ Completion of a program, as reported by the API """
+    return round(result.completed / result.required, 2) if result.required != 0 else 0
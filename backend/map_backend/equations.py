@@ -0,0 +1,96 @@
+import json
+from collections import namedtuple
+from django.db.models import Prefetch
+from .models import Program, RequirementGroup, RequirementItem, Course
+from .requirement_handler import AND, BinOp, build_group
+from .version import data_version
+
+
+class EquationLeaf(namedtuple('EquationLeaf', ['units', 'codes'])):
+    """ A requirement item as displayed to the user """
+
+    def __str__(self):
+        return f"{self.units} units of {', '.join(self.codes)}"
+
+
+def with_requirements(programs):
+    """ Prefetches everything needed to compile or render programs, in a fixed number of queries """
+    return programs.prefetch_related(
+            Prefetch('requirements', queryset=RequirementGroup.objects.order_by('order', 'pk')),
+            Prefetch('requirements__requirementitem_set', queryset=RequirementItem.objects.order_by('pk')),
+            Prefetch('requirements__requirementitem_set__req_list__courses', queryset=Course.objects.only('course_id', 'code', 'units')))
+
+
+def tree_form(tree):
+    """ Structured form of a requirement tree, for clients that draw it themselves """
+    # built bottom up without recursion, as BinOp.__str__ is
+    built = []
+    stack = [(tree, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+        if not isinstance(node, BinOp):
+            built.append({"units": node.units, "courses": list(node.codes)})
+        elif not expanded:
+            stack.append((node, True))
+            stack.append((node.right, False))
+            stack.append((node.left, False))
+        else:
+            right = built.pop()
+            left = built.pop()
+            built.append({"op": "AND" if node.op == AND else "OR", "children": [left, right]})
+
+    return built[0]
+
+
+def render_equations(program):
+    """
+    Display strings and structured trees of every requirement group of a program
+    Uses the prefetched requirements when there are some
+    """
+    requirements = []
+    trees = []
+
+    for requirement in program.requirements.all():
+        items = requirement.requirementitem_set.all()
+        codes = {item.pk: [c.code for c in item.req_list.courses.all()] if item.req_list else [] for item in items}
+
+        tree = build_group(items, requirement.connector, lambda item: EquationLeaf(item.req_units, codes[item.pk]))
+        requirements.append(str(tree))
+        trees.append(tree_form(tree))
+
+    return {"requirements": requirements, "tree": trees}
+
+
+def stored_equations(program, version):
+    """ The equations stored for a program, or None when they were rendered for older data """
+    if program.equations is None or program.equations_version != version:
+        return None
+
+    return json.loads(program.equations)
+
+
+def store_equations(program, equations, version):
+    """ Sets the stored equations of a program, the caller saves it """
+    program.equations = json.dumps(equations)
+    program.equations_version = version
+
+
+def program_equations(program):
+    """ Stored equations of a program, rendered (but not saved) if they are out of date """
+    equations = stored_equations(program, data_version())
+    return equations if equations is not None else render_equations(program)
+
+
+def refresh_equations():
+    """
+    Renders and stores the equations of every program for the current data version
+    Used by the loaders and the admin, requests never write them
+    """
+    version = data_version()
+    programs = list(with_requirements(Program.objects.all()))
+
+    for program in programs:
+        store_equations(program, render_equations(program), version)
+
+    Program.objects.bulk_update(programs, ['equations', 'equations_version'], batch_size=500)
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import defaultdict, namedtuple
+from django.apps import apps
+from django.conf import settings
+from django.db import connections as db_connections, router, transaction
+from django.db.models.signals import post_save, post_delete
+from haystack import connections
+from haystack.exceptions import NotHandled
+from haystack.signals import BaseSignalProcessor
+from .models import IndexQueue
+from .version import bump_index_version
+
+# Result of draining the index queue
+#   documents: objects (re)indexed or removed, seconds: time spent
+DrainStats = namedtuple('DrainStats', ['documents', 'seconds'])
+
+# per thread: the changes waiting for the current transaction to commit, and the DrainStats of the last drain
+_local = threading.local()
+
+
+class PendingChanges:
+    """ Objects changed in a transaction, {(model label, pk), ...} """
+
+    def __init__(self):
+        self.objects = set()
+
+    def flush(self):
+        """ Writes the changes to the queue, and drains it when SEARCH_INDEX_DRAIN_ON_COMMIT is set """
+        if getattr(_local, 'pending', None) is self:
+            _local.pending = None
+
+        IndexQueue.objects.bulk_create([IndexQueue(model=model, object_id=pk) for model, pk in self.objects],
+                batch_size=settings.SEARCH_INDEX_BATCH_SIZE)
+
+        if settings.SEARCH_INDEX_DRAIN_ON_COMMIT:
+            drain_index_queue()
+
+
+def last_drain():
+    """ DrainStats of the last drain of this thread, None if there was none """
+    return getattr(_local, 'last_drain', None)
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """
+    Queues saved and deleted objects instead of indexing each one as it changes
+
+    Changes are written to the IndexQueue table in one insert once the transaction
+    commits (right away outside of a transaction), then drained in batches of
+    SEARCH_INDEX_BATCH_SIZE when SEARCH_INDEX_DRAIN_ON_COMMIT is set, or by the
+    drain_index_queue command otherwise. A load in a transaction is so indexed
+    with a few large index commits rather than one per object.
+    """
+
+    def setup(self):
+        for model in self.indexed_models():
+            post_save.connect(self.handle_save, sender=model, dispatch_uid="index_save_{}".format(model.__name__))
+            post_delete.connect(self.handle_delete, sender=model, dispatch_uid="index_delete_{}".format(model.__name__))
+
+    def teardown(self):
+        for model in self.indexed_models():
+            post_save.disconnect(self.handle_save, sender=model, dispatch_uid="index_save_{}".format(model.__name__))
+            post_delete.disconnect(self.handle_delete, sender=model, dispatch_uid="index_delete_{}".format(model.__name__))
+
+    def indexed_models(self):
+        models = set()
+        for using in self.connections.connections_info:
+            models.update(self.connections[using].get_unified_index().get_indexed_models())
+        return models
+
+    def handle_save(self, sender, instance, **kwargs):
+        queue_change(instance)
+
+    def handle_delete(self, sender, instance, **kwargs):
+        queue_change(instance)
+
+
+def queue_change(instance):
+    """ Queues the document of an object, for when the current transaction commits """
+    using = router.db_for_write(IndexQueue)
+    connection = db_connections[using]
+
+    pending = getattr(_local, 'pending', None)
+    # a new transaction, or the last one was rolled back and its flush dropped
+    if pending is None or not connection.in_atomic_block or not any(hook[1] == pending.flush for hook in connection.run_on_commit):
+        pending = _local.pending = PendingChanges()
+        pending.objects.add((instance._meta.label_lower, str(instance.pk)))
+        # runs right away outside of a transaction
+        transaction.on_commit(pending.flush, using=using)
+        return
+
+    pending.objects.add((instance._meta.label_lower, str(instance.pk)))
+
+
+def index_batch(entries):
+    """ Indexes the objects of a batch that still exist and removes the documents of the others, returns how many there were """
+    by_model = defaultdict(set)
+    for model, pk in entries:
+        by_model[model].add(pk)
+
+    documents = 0
+    for label, pks in by_model.items():
+        model = apps.get_model(label)
+
+        for using in connections.connections_info:
+            try:
+                index = connections[using].get_unified_index().get_index(model)
+            except NotHandled:
+                continue
+            backend = connections[using].get_backend()
+
+            objects = list(index.index_queryset(using=using).filter(pk__in=pks))
+            if objects:
+                backend.update(index, objects)
+            for pk in pks - {str(obj.pk) for obj in objects}:
+                backend.remove("{}.{}".format(label, pk))
+
+        documents += len(pks)
+
+    return documents
+
+
+def drain_index_queue(batch_size=None):
+    """
+    Indexes every queued object, batch_size (SEARCH_INDEX_BATCH_SIZE) at a time. Returns DrainStats
+    The index version is bumped when anything was indexed, the data version is left alone
+    """
+    batch_size = batch_size or settings.SEARCH_INDEX_BATCH_SIZE
+    start = time.perf_counter()
+    documents = 0
+
+    while True:
+        rows = list(IndexQueue.objects.order_by('id').values_list('id', 'model', 'object_id')[:batch_size])
+        if not rows:
+            break
+
+        # an object queued more than once in the batch is indexed once
+        documents += index_batch({(model, pk) for i, model, pk in rows})
+        IndexQueue.objects.filter(id__in=[i for i, model, pk in rows]).delete()
+
+    # Search responses, their ETags and the search cache of every worker depend on the index
+    if documents:
+        bump_index_version()
+
+    _local.last_drain = DrainStats(documents, time.perf_counter() - start)
+    return _local.last_drain
@@ -0,0 +1,58 @@
+import random
+from django.core.management.base import BaseCommand
+from map_backend.benchmarks import AND, OR, build_plan, synthetic_tokens, calculate_binop, timed
+from map_backend.requirement_handler import Parser, flatten, normalize
+from map_backend.engine import Selection, calculate
+
+# (name, group connector, connectors between items)
+SHAPES = (
+        ("OR chain", OR, (OR,)),
+        ("AND chain", OR, (AND,)),
+        ("mixed", OR, (AND, OR)),
+)
+
+
+def compare(tokens, connector, selection, repeat):
+    """ Best times of building, checking and rendering a group with BinOps and with normalized Nodes """
+    binop = Parser(tokens, not connector).parse()
+    node = normalize(flatten(Parser(tokens, not connector).parse()))
+
+    if calculate_binop(binop, selection.mask, selection) != calculate(node, selection.mask, selection):
+        raise AssertionError("results differ")
+
+    return (
+            timed(lambda: Parser(tokens, not connector).parse(), repeat)[0],
+            timed(lambda: normalize(flatten(Parser(tokens, not connector).parse())), repeat)[0],
+            timed(lambda: calculate_binop(binop, selection.mask, selection), repeat)[0],
+            timed(lambda: calculate(node, selection.mask, selection), repeat)[0],
+            timed(lambda: str(binop), repeat)[0],
+            timed(lambda: str(node), repeat)[0])
+
+
+class Command(BaseCommand):
+    help = 'Compares Parser/BinOp trees with flattened, normalized requirement trees on large groups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, nargs='+', default=[100, 200, 400])
+        parser.add_argument('--courses', type=int, default=300)
+        parser.add_argument('--selected', type=int, default=15)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        courses = options['courses']
+        plan = build_plan({course_id: 3 for course_id in range(courses)}, [])
+        selection = Selection(plan, rng.sample(range(courses), options['selected']))
+
+        print('\n{:<12} {:>6} {:>12} {:>12} {:>12} {:>12} {:>12} {:>12}'.format(
+                'shape', 'items', 'parse us', 'normal us', 'binop us', 'node us', 'str binop', 'str node'))
+        row = '{:<12} {:>6} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f}'
+
+        for items in options['items']:
+            for name, connector, connectors in SHAPES:
+                tokens = synthetic_tokens(rng, items, connectors, courses)
+                times = compare(tokens, connector, selection, options['repeat'])
+                print(row.format(name, items, *(t * 1e6 for t in times)))
+
+        print('\nparse: Parser only, normal: Parser then flatten and normalize (done once per data load).')
+        print('Times are the best of {} runs, in microseconds.\n'.format(options['repeat']))
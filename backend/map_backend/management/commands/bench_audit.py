@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from map_backend.benchmarks import synthetic_plan, synthetic_selections, timed, percentile
+from map_backend.views import match_programs
+
+# p99 latency target of an audit (60 courses, every program), in milliseconds
+P99_TARGET_MS = 50
+
+
+class Command(BaseCommand):
+    help = 'Checks the p99 latency of audit mode SubmitCourseSelections responses against its target'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--programs', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=3)
+        parser.add_argument('--items', type=int, default=6)
+        parser.add_argument('--list-size', type=int, default=20)
+        parser.add_argument('--courses', type=int, default=600)
+        parser.add_argument('--selections', type=int, default=200)
+        parser.add_argument('--sizes', type=int, nargs='+', default=[15, 30, 45, 60])
+        parser.add_argument('--target-ms', type=float, default=P99_TARGET_MS)
+
+    def handle(self, *args, **options):
+        plan = synthetic_plan(options['programs'], options['groups'], options['items'], options['list_size'], options['courses'])
+
+        print('\n{} programs of {}x{} items, lists of {} out of {} courses'.format(
+                options['programs'], options['groups'], options['items'], options['list_size'], options['courses']))
+        print('{:>8} {:>10} {:>10} {:>10}'.format('courses', 'p50 ms', 'p99 ms', 'max ms'))
+
+        p99 = 0
+        for size in options['sizes']:
+            durations = []
+            for selection in synthetic_selections(plan, options['selections'], size):
+                # the whole response is built, as for a cache miss
+                durations.extend(timed(lambda: match_programs(plan, selection), 1))
+            durations.sort()
+            p99 = percentile(durations, 99) * 1000
+            print('{:>8} {:>10.2f} {:>10.2f} {:>10.2f}'.format(size, percentile(durations, 50) * 1000, p99, durations[-1] * 1000))
+
+        print('\np99 target at {} courses: {} ms\n'.format(options['sizes'][-1], options['target_ms']))
+        if p99 > options['target_ms']:
+            raise CommandError('p99 of {:.2f} ms is over the {} ms target'.format(p99, options['target_ms']))
@@ -0,0 +1,85 @@
+import json
+import random
+import tracemalloc
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from map_backend.models import Course, Calculator
+from map_backend.views import COURSE_FIELDS, SEASONS, build_course_data, course_data_query, stream_course_data
+
+DEPARTMENTS = 40
+
+
+def peak_memory(fn):
+    """ Runs fn, returns the peak of memory allocated while it ran, in bytes """
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def create_calculator(rng, calculator_id, first_course_id, courses):
+    """ A calculator with random courses, descriptions are a few hundred characters as in real catalogs """
+    created = []
+    for course_id in range(first_course_id, first_course_id + courses):
+        created.append(Course(
+                course_id=course_id,
+                code="DEPT{} {}".format(course_id % DEPARTMENTS, course_id),
+                name="Course {}".format(course_id),
+                desc="Description of course {}. ".format(course_id) * rng.randint(5, 15),
+                offered_fall=rng.random() < 0.7,
+                offered_winter=rng.random() < 0.7,
+                offered_summer=rng.random() < 0.2,
+                offered_spring=rng.random() < 0.2,
+                units=3,
+                department="Department {}".format(course_id % DEPARTMENTS)))
+    Course.objects.bulk_create(created, batch_size=1000)
+
+    calculator = Calculator.objects.create(calculator_id=calculator_id, title="Benchmark {}".format(courses))
+    Through = Calculator.courses.through
+    Through.objects.bulk_create([Through(calculator_id=calculator_id, course_id=course.course_id) for course in created], batch_size=1000)
+    return calculator
+
+
+class Command(BaseCommand):
+    help = 'Compares the peak memory of built and streamed GetCourseData responses as calculators grow'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[5000, 20000, 50000])
+        parser.add_argument('--chunk-size', type=int, default=settings.COURSE_DATA_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        fields = tuple(COURSE_FIELDS)
+        seasons = tuple(SEASONS)
+
+        print('\n{:>8} {:>12} {:>12} {:>12}'.format('courses', 'built MB', 'streamed MB', 'bytes'))
+
+        # everything is created in a transaction that is rolled back
+        with transaction.atomic():
+            first_course_id = (Course.objects.aggregate(Max('course_id'))['course_id__max'] or 0) + 1
+            calculator_id = (Calculator.objects.aggregate(Max('calculator_id'))['calculator_id__max'] or 0) + 1
+
+            for size in options['sizes']:
+                create_calculator(rng, calculator_id, first_course_id, size)
+                first_course_id += size
+
+                # the whole response in memory, as the cached endpoint builds it
+                built = peak_memory(lambda: json.dumps(build_course_data(calculator_id, fields, seasons)))
+
+                sent = []
+                def stream():
+                    title, courses = course_data_query(calculator_id, seasons, None)
+                    for chunk in stream_course_data(title, courses, fields, seasons, options['chunk_size']):
+                        sent.append(len(chunk))
+                streamed = peak_memory(stream)
+
+                print('{:>8} {:>12.1f} {:>12.1f} {:>12}'.format(size, built / 2**20, streamed / 2**20, sum(sent)))
+                calculator_id += 1
+
+            transaction.set_rollback(True)
+
+        print('\nStreamed chunks of {} courses, memory is the peak traced by tracemalloc.\n'.format(options['chunk_size']))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from map_backend.benchmarks import synthetic_courses, synthetic_queries, timed, percentile
+from map_backend.search import SearchIndex
+
+# latency target of one in-memory search, in milliseconds
+TARGET_MS = 1
+
+
+class Command(BaseCommand):
+    help = 'Times the in-memory search index over a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=10000)
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=50)
+        parser.add_argument('--target-ms', type=float, default=TARGET_MS)
+
+    def handle(self, *args, **options):
+        courses = synthetic_courses(options['courses'])
+        build = timed(lambda: SearchIndex(0, courses), 1)[0]
+        index = SearchIndex(0, courses)
+
+        durations = []
+        hits = 0
+        for query in synthetic_queries(courses, options['queries']):
+            durations.extend(timed(lambda: index.search(query, options['limit']), 1))
+            hits += len(index.search(query, options['limit'])[0])
+        durations.sort()
+
+        print('\n{} courses, index built in {:.0f} ms, {:.1f} hits per query'.format(len(courses), build * 1000, hits / len(durations)))
+        print('{:>10} {:>10} {:>10}'.format('p50 ms', 'p99 ms', 'max ms'))
+        p99 = percentile(durations, 99) * 1000
+        print('{:>10.3f} {:>10.3f} {:>10.3f}\n'.format(percentile(durations, 50) * 1000, p99, durations[-1] * 1000))
+
+        if p99 > options['target_ms']:
+            raise CommandError('p99 of {:.3f} ms is over the {} ms target'.format(p99, options['target_ms']))
@@ -0,0 +1,80 @@
+import shutil
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+from haystack import connections
+from haystack.query import SearchQuerySet
+from map_backend.benchmarks import synthetic_courses, synthetic_queries, timed, percentile
+from map_backend.db_search import search_courses
+from map_backend.models import Course
+from map_backend.search import SearchIndex
+from map_backend.search_indexes import CourseIndex
+
+# haystack connection of the throwaway Whoosh index
+BENCH_ALIAS = 'bench_search'
+
+
+def time_queries(search, queries):
+    """ Sorted durations of one search per query """
+    durations = []
+    for query in queries:
+        durations.extend(timed(lambda: search(query), 1))
+    return sorted(durations)
+
+
+class Command(BaseCommand):
+    help = 'Compares the Whoosh, in-memory and database search backends on a synthetic catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=10000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=50)
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        path = tempfile.mkdtemp()
+        connections.connections_info[BENCH_ALIAS] = {
+                'ENGINE': 'haystack.backends.whoosh_backend.WhooshEngine',
+                'PATH': path,
+        }
+
+        print('\n{} courses, {} queries, {} results each, database is {}'.format(options['courses'], options['queries'], limit, connection.vendor))
+        print('{:<10} {:>10} {:>10} {:>10} {:>10}'.format('backend', 'build s', 'p50 ms', 'p99 ms', 'max ms'))
+        row = '{:<10} {:>10.2f} {:>10.3f} {:>10.3f} {:>10.3f}'
+
+        # the courses are created in a transaction that is rolled back,
+        # Whoosh gets its own index in a temporary directory
+        try:
+            with transaction.atomic():
+                first_course_id = (Course.objects.aggregate(Max('course_id'))['course_id__max'] or 0) + 1
+                records = [record._replace(course_id=first_course_id + i) for i, record in enumerate(synthetic_courses(options['courses']))]
+                queries = synthetic_queries(records, options['queries'])
+
+                courses = [Course(course_id=r.course_id, code=r.code, name=r.name, desc="", units=r.units, department=r.department,
+                        offered_fall=r.offered_fall, offered_winter=r.offered_winter, offered_summer=r.offered_summer,
+                        offered_spring=r.offered_spring) for r in records]
+                database = timed(lambda: Course.objects.bulk_create(courses, batch_size=1000), 1)[0]
+
+                backend = connections[BENCH_ALIAS].get_backend()
+                whoosh = timed(lambda: backend.update(CourseIndex(), courses), 1)[0]
+                sqs = SearchQuerySet(using=BENCH_ALIAS)
+                durations = time_queries(lambda query: list(sqs.filter(content=query)[:limit]), queries)
+                print(row.format('whoosh', whoosh, percentile(durations, 50) * 1000, percentile(durations, 99) * 1000, durations[-1] * 1000))
+
+                start = time.perf_counter()
+                index = SearchIndex(0, records)
+                memory = time.perf_counter() - start
+                durations = time_queries(lambda query: index.search(query, limit), queries)
+                print(row.format('memory', memory, percentile(durations, 50) * 1000, percentile(durations, 99) * 1000, durations[-1] * 1000))
+
+                durations = time_queries(lambda query: search_courses(query, limit), queries)
+                print(row.format('database', database, percentile(durations, 50) * 1000, percentile(durations, 99) * 1000, durations[-1] * 1000))
+
+                transaction.set_rollback(True)
+        finally:
+            del connections.connections_info[BENCH_ALIAS]
+            shutil.rmtree(path, ignore_errors=True)
+
+        print('\nBuild is the time to index the courses, for the database the insert that keeps its index up to date.\n')
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from map_backend.benchmarks import fixture_plans, synthetic_plan, synthetic_selections, timed
+from map_backend.engine import Selection, evaluate_program, percentage
+from map_backend.solver import solve_program, MAX_NODES, TIME_LIMIT
+
+
+def compare(plan, selections, max_nodes, time_limit, repeat):
+    """ Times both engines over every (program, selection) pair and compares their percentages """
+    selections = [Selection(plan, s) for s in selections]
+    pairs = [(program, selection) for selection in selections for program in plan.programs]
+
+    greedy = timed(lambda: [evaluate_program(p, s) for p, s in pairs], repeat)
+    optimal = timed(lambda: [solve_program(p, s, max_nodes, time_limit) for p, s in pairs], repeat)
+
+    # a fallback is the greedy result, because the budget ran out or it scored higher
+    improved = worse = fallbacks = 0
+    for program, selection in pairs:
+        solution = solve_program(program, selection, max_nodes, time_limit)
+        difference = percentage(solution.result) - percentage(evaluate_program(program, selection))
+        if solution.assignment is None:
+            fallbacks += 1
+        if difference > 0:
+            improved += 1
+        elif difference < 0:
+            worse += 1
+
+    return len(pairs), greedy[0], optimal[0], improved, worse, fallbacks
+
+
+class Command(BaseCommand):
+    help = 'Compares the greedy engine with the memoized optimal solver'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--programs', type=int, default=50)
+        parser.add_argument('--groups', type=int, default=3)
+        parser.add_argument('--items', type=int, default=6)
+        parser.add_argument('--list-size', type=int, default=20)
+        parser.add_argument('--max-nodes', type=int, default=MAX_NODES)
+        parser.add_argument('--time-limit', type=float, default=TIME_LIMIT)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        max_nodes = options['max_nodes']
+        time_limit = options['time_limit']
+        repeat = options['repeat']
+
+        print('\n{:<40} {:>6} {:>12} {:>12} {:>9} {:>6} {:>10}'.format('scenario', 'pairs', 'greedy ms', 'optimal ms', 'improved', 'worse', 'fallbacks'))
+        row = '{:<40} {:>6} {:>12.3f} {:>12.3f} {:>9} {:>6} {:>10}'
+
+        for name, plan, selections in fixture_plans():
+            pairs, greedy, optimal, improved, worse, fallbacks = compare(plan, selections, max_nodes, time_limit, repeat)
+            print(row.format(name, pairs, greedy * 1000, optimal * 1000, improved, worse, fallbacks))
+
+        for items in sorted({2, options['items'] // 2, options['items']}):
+            plan = synthetic_plan(options['programs'], options['groups'], items, options['list_size'])
+            selections = synthetic_selections(plan, count=10)
+            name = 'synthetic {}x{} items, lists of {}'.format(options['groups'], items, options['list_size'])
+            pairs, greedy, optimal, improved, worse, fallbacks = compare(plan, selections, max_nodes, time_limit, repeat)
+            print(row.format(name, pairs, greedy * 1000, optimal * 1000, improved, worse, fallbacks))
+
+        print('\nTimes are the best of {} runs over all pairs.\n'.format(repeat))
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from map_backend.indexing import drain_index_queue
+
+
+class Command(BaseCommand):
+    help = 'Indexes every object queued by the search signal processor'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.SEARCH_INDEX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        stats = drain_index_queue(options['batch_size'])
+        rate = stats.documents / stats.seconds if stats.seconds else 0
+        print('Indexed {} documents in {:.2f} s ({:.0f} documents/s)'.format(stats.documents, stats.seconds, rate))
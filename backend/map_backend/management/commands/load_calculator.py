@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand, CommandError
 from map_backend.models import Course, Calculator, Program
+from map_backend.version import bump_data_version
+from map_backend.equations import refresh_equations
 from django.conf import settings
 import os, json
 
@@ -39,10 +41,15 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('file_dir', type=lambda x: is_valid_file(parser,x))
         parser.add_argument('file_dir2', type=lambda x: is_valid_file(parser,x))
+        # the Load view renders equations once, after every loader ran
+        parser.add_argument('--skip-equations', action='store_true')
 
     def handle(self, *args, **options):
         course_data = options['file_dir']
         program_data = options['file_dir2']
         print('\nUploading Course/Program Data to create a Science Calculator with id 1...\n')
         load_course(course_data, program_data)
+        bump_data_version()
+        if not options['skip_equations']:
+            refresh_equations()
         print('\nSucessfully Upload\n')
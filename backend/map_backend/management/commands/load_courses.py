@@ -1,5 +1,9 @@
 from django.core.management.base import BaseCommand, CommandError
 from map_backend.models import Course
+from map_backend.version import bump_data_version
+from map_backend.equations import refresh_equations
+from map_backend.indexing import last_drain
+from django.db import transaction
 from django.conf import settings
 import os, json
 
@@ -34,9 +38,19 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument('file_dir', type=lambda x: is_valid_file(parser,x))
+        # the Load view renders equations once, after every loader ran
+        parser.add_argument('--skip-equations', action='store_true')
 
     def handle(self, *args, **options):
         course_data = options['file_dir']
         print('\nUploading Course Data...\n')
-        load_course(course_data)
+        # one transaction, courses are indexed together once it commits
+        with transaction.atomic():
+            load_course(course_data)
+        stats = last_drain()
+        if stats is not None and stats.seconds:
+            print('Indexed {} courses ({:.0f} documents/s)'.format(stats.documents, stats.documents / stats.seconds))
+        bump_data_version()
+        if not options['skip_equations']:
+            refresh_equations()
         print('\nSucessfully Upload\n')
@@ -0,0 +1,23 @@
+# Generated by Django 3.0.12 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('map_backend', '0002_dataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='program',
+            name='equations',
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='program',
+            name='equations_version',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Full-text search of courses in the database itself, see map_backend/db_search.py
+
+from django.db import migrations
+
+# the vector must be the same expression as in db_search.py for the index to be used
+POSTGRES_FORWARDS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX map_backend_course_search ON map_backend_course USING GIN "
+    "(to_tsvector('simple', code || ' ' || replace(code, ' ', '') || ' ' || name))",
+    "CREATE INDEX map_backend_course_name_trgm ON map_backend_course USING GIN (name gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARDS = [
+    "DROP INDEX IF EXISTS map_backend_course_search",
+    "DROP INDEX IF EXISTS map_backend_course_name_trgm",
+]
+
+# rowid is the course_id, code_key is the code without spaces (COMPSCI1MD3)
+SQLITE_FORWARDS = [
+    "CREATE VIRTUAL TABLE map_backend_course_fts USING fts5(code, code_key, name, prefix='2 3 4')",
+    "INSERT INTO map_backend_course_fts (rowid, code, code_key, name) "
+    "SELECT course_id, code, replace(code, ' ', ''), name FROM map_backend_course",
+    "CREATE TRIGGER map_backend_course_fts_insert AFTER INSERT ON map_backend_course BEGIN "
+    "INSERT INTO map_backend_course_fts (rowid, code, code_key, name) VALUES (new.course_id, new.code, replace(new.code, ' ', ''), new.name); END",
+    "CREATE TRIGGER map_backend_course_fts_delete AFTER DELETE ON map_backend_course BEGIN "
+    "DELETE FROM map_backend_course_fts WHERE rowid = old.course_id; END",
+    "CREATE TRIGGER map_backend_course_fts_update AFTER UPDATE ON map_backend_course BEGIN "
+    "DELETE FROM map_backend_course_fts WHERE rowid = old.course_id; "
+    "INSERT INTO map_backend_course_fts (rowid, code, code_key, name) VALUES (new.course_id, new.code, replace(new.code, ' ', ''), new.name); END",
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS map_backend_course_fts_insert",
+    "DROP TRIGGER IF EXISTS map_backend_course_fts_delete",
+    "DROP TRIGGER IF EXISTS map_backend_course_fts_update",
+    "DROP TABLE IF EXISTS map_backend_course_fts",
+]
+
+
+def run(statements):
+    """ Runs the statements for the database in use, other databases have no full-text index """
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('map_backend', '0004_indexqueue'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'postgresql': POSTGRES_FORWARDS, 'sqlite': SQLITE_FORWARDS}),
+            run({'postgresql': POSTGRES_BACKWARDS, 'sqlite': SQLITE_BACKWARDS}),
+        ),
+    ]
@@ -1,5 +1,4 @@
 from django.db import models
-from .requirement_handler import Parser
 
 class Course(models.Model):
     """ Course, e.g. COMPSCI 1MD3 """
@@ -111,37 +110,19 @@ class Program(models.Model):
     desc = models.TextField()
     # requirement groups
     requirements = models.ManyToManyField(RequirementGroup)
+    # rendered requirement equations (JSON), see equations.py
+    equations = models.TextField(blank=True, null=True, editable=False)
+    # data version the equations were rendered for
+    equations_version = models.CharField(max_length=32, blank=True, null=True, editable=False)
 
 
     def __str__(self):
         return "{} - {}".format(self.pk, self.name)
 
     def requirement_equation(self):
-        output_requirements = []
-
-        requirement_groups = self.requirements.all().order_by('order')
-
-        for requirement in requirement_groups:
-            requirement_items = requirement.requirementitem_set.all()
-
-            build_requirements = []
-
-            for i, item in enumerate(requirement_items):
-                # We skip the connector for the first item
-                if i != 0:
-                    build_requirements.append(item.connector)
-
-                units = item.req_units
-                check_list = list((item.req_list.courses.all().values_list('code', flat=True)))
-
-                check_list = f"{units} units of {', '.join(c for c in check_list)}"
-
-                build_requirements.append(check_list)
-
-            check_list = Parser(build_requirements, not requirement.connector).parse()
-            output_requirements.append(str(check_list))
-
-        return {"requirements": output_requirements}
+        """ Display strings of the requirement groups, rendered when data is loaded """
+        from .equations import program_equations
+        return {"requirements": program_equations(self)["requirements"]}
 
 class Calculator(models.Model):
     """ A calculator contains specific courses/programs to display to the user """
@@ -157,3 +138,30 @@ class Calculator(models.Model):
 
     def __str__(self):
         return self.title
+
+class DataVersion(models.Model):
+    """
+    Stamp of the loaded data, changed every time data is (re)loaded, in row 1
+    Row 2 is the stamp of the search index, changed every time its queue is drained, see version.py
+    """
+
+    # number of times data has been loaded
+    version = models.PositiveIntegerField(default=0)
+    # random stamp, unique to every load
+    stamp = models.CharField(max_length=32)
+    # when data was last loaded
+    updated = models.DateTimeField()
+
+    def __str__(self):
+        return "Version {} ({})".format(self.version, self.updated)
+
+class IndexQueue(models.Model):
+    """ An object whose search index document is out of date, see indexing.py """
+
+    # label of the model, e.g. map_backend.course
+    model = models.CharField(max_length=100)
+    # primary key of the object
+    object_id = models.CharField(max_length=64)
+
+    def __str__(self):
+        return "{}.{}".format(self.model, self.object_id)
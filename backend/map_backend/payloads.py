@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import json
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from .conditional import cacheable
+from .version import data_version
+
+# brotli is optional, responses are only precompressed with gzip without it
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# compression of cached payloads, built once and served many times
+GZIP_LEVEL = 9
+# compression of payloads built for one response (see one_off_payload), where the time spent matters more
+FAST_GZIP_LEVEL = 6
+FAST_BROTLI_QUALITY = 5
+
+# A serialized response, built once per data version
+#   bodies maps a content coding ("identity", "gzip", "br") to its bytes
+#   etag is the strong validator of the identity body, other codings add their name to it
+Payload = namedtuple('Payload', ['bodies', 'etag'])
+
+
+class PayloadCache:
+    """ Prebuilt payloads of this worker, the least recently used are dropped past PAYLOAD_CACHE_SIZE """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.version = None
+
+    def get(self, key, build):
+        """
+        Returns the payload for key, calling build() for the data to serialize if there is none
+        build may raise, nothing is stored then
+        """
+        version = data_version()
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+        payload = self.entries.get(key)
+        if payload is None:
+            payload = self.entries[key] = make_payload(build())
+            while len(self.entries) > settings.PAYLOAD_CACHE_SIZE:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+
+        return payload
+
+
+# cache of this worker
+payload_cache = PayloadCache()
+
+
+def make_payload(data, codings=("gzip", "br"), fast=False):
+    """
+    Serializes data as JSON, with its compressed variants in codings
+    fast compresses at a lower level, for a payload that is only served once
+    """
+    content = json.dumps(data).encode()
+    bodies = {"identity": content}
+    if "gzip" in codings:
+        bodies["gzip"] = gzip.compress(content, compresslevel=FAST_GZIP_LEVEL if fast else GZIP_LEVEL, mtime=0)
+    if "br" in codings and brotli is not None:
+        bodies["br"] = brotli.compress(content, quality=FAST_BROTLI_QUALITY) if fast else brotli.compress(content)
+
+    return Payload(bodies, hashlib.sha1(content).hexdigest())
+
+
+def one_off_payload(request, data):
+    """ Payload of a response that isn't cached: only the coding the client prefers is built, at a fast level """
+    accepted = client_codings(request)
+    for coding in ("br", "gzip"):
+        if coding in accepted and (coding != "br" or brotli is not None):
+            return make_payload(data, (coding,), fast=True)
+    return make_payload(data, ())
+
+
+def etag_of(payload, coding):
+    return '"{}"'.format(payload.etag if coding == "identity" else "{}-{}".format(payload.etag, coding))
+
+
+def client_codings(request):
+    """ Content codings listed in Accept-Encoding """
+    return {part.split(";")[0].strip() for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(",")}
+
+
+def accepted_coding(request, payload):
+    """ Best content coding of payload the client accepts """
+    accepted = client_codings(request)
+    for coding in ("br", "gzip"):
+        if coding in accepted and coding in payload.bodies:
+            return coding
+    return "identity"
+
+
+def payload_response(request, payload):
+    """
+    Serves a payload in the best coding the client accepts
+    Answers 304 when If-None-Match holds the ETag of any coding of the payload
+    """
+    coding = accepted_coding(request, payload)
+    etag = etag_of(payload, coding)
+
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        tags = {tag.strip().replace('W/', '', 1) for tag in if_none_match.split(",")}
+        if "*" in tags or tags & {etag_of(payload, c) for c in payload.bodies}:
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            response["Cache-Control"] = settings.PAYLOAD_CACHE_CONTROL
+            patch_vary_headers(response, ("Accept-Encoding",))
+            return response
+
+    response = HttpResponse(payload.bodies[coding], content_type="application/json")
+    if coding != "identity":
+        response["Content-Encoding"] = coding
+    response["ETag"] = etag
+    response["Cache-Control"] = settings.PAYLOAD_CACHE_CONTROL
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return cacheable(response)
@@ -0,0 +1,164 @@
+from collections import namedtuple
+from types import MappingProxyType
+from .models import Calculator
+from .requirement_handler import build_group, flatten, normalize
+from .equations import with_requirements, render_equations, stored_equations
+from .engine import ProgramResult, all_courses, min_required, calculate
+from .scoring import build_matrix
+from .version import data_version
+
+# A requirement leaf: number of units needed from a course list.
+# mask has one bit set per course in the list, see CalculatorPlan.index
+Leaf = namedtuple('Leaf', ['units', 'mask'])
+
+# A requirement item as entered: its primary key, units and the mask of its course list
+ItemPlan = namedtuple('ItemPlan', ['item_id', 'units', 'mask'])
+
+# A requirement group: the parsed tree of leaves, its display string,
+# the mask of every course in it and its items in order (see GetCourseRequirements)
+GroupPlan = namedtuple('GroupPlan', ['tree', 'equation', 'courses', 'items'])
+
+# A program with all of its requirement groups resolved (in order).
+# equation_tree holds the structured form of every group, see equations.py
+ProgramPlan = namedtuple('ProgramPlan', ['program_id', 'name', 'desc', 'groups', 'equation_tree'])
+
+# A calculator and the compiled plans of the programs it checks against.
+# Every course referenced by a requirement is given a dense bit position:
+#   index maps course_id -> bit, units and codes are indexed by bit
+#   matrix is used to score all programs at once, see scoring.py
+#   course_programs[bit] holds the positions of the programs that refer to the course
+#   min_required[program] is the fewest units the program can ask for, see ranking.py
+#   untouched[program] is the result of the program when none of its courses are selected
+#   offered is the mask of the courses the calculator lets users select, course_ids is indexed by bit
+CalculatorPlan = namedtuple('CalculatorPlan', ['calculator_id', 'programs', 'index', 'units', 'codes', 'matrix',
+        'course_programs', 'min_required', 'untouched', 'offered', 'course_ids'])
+
+# compiled plans, keyed by calculator_id, for data version _plans_version
+_plans = {}
+_plans_version = None
+
+
+def compile_program(program, index, version):
+    """
+    Compiles a program (with its requirements prefetched) into a ProgramPlan
+    Courses are added to index as they are first seen.
+    """
+    trees = []
+    group_items = []
+
+    for requirement in program.requirements.all():
+        items = requirement.requirementitem_set.all()
+
+        # an item without a course list can never be satisfied
+        courses = {item.pk: list(item.req_list.courses.all()) if item.req_list else [] for item in items}
+
+        masks = {}
+        for pk, course_list in courses.items():
+            mask = 0
+            for course in course_list:
+                bit = index.setdefault(course.course_id, (len(index), course))[0]
+                mask |= 1 << bit
+            masks[pk] = mask
+        group_items.append(tuple(ItemPlan(item.pk, item.req_units, masks[item.pk]) for item in items))
+
+        # simplified for checking, the equations show the items as entered
+        trees.append(normalize(flatten(build_group(items, requirement.connector,
+                lambda item: Leaf(item.req_units, masks[item.pk])))))
+
+    # equations are rendered and stored when data is loaded, stale ones are rendered here
+    # but never written, requests don't write to the database
+    equations = stored_equations(program, version)
+    if equations is None or len(equations["requirements"]) != len(trees):
+        equations = render_equations(program)
+
+    plan = ProgramPlan(
+            program.program_id,
+            program.name,
+            program.desc,
+            tuple(GroupPlan(tree, equation, all_courses(tree), items) for tree, equation, items in zip(trees, equations["requirements"], group_items)),
+            tuple(equations["tree"]))
+
+    return plan
+
+
+def compile_calculator(calculator, version):
+    """ Compiles every program of a calculator, using a fixed number of queries """
+    programs = with_requirements(calculator.programs.all())
+
+    # course_id -> (bit, course)
+    index = {}
+    compiled = [compile_program(program, index, version) for program in programs]
+
+    courses = [course for bit, course in sorted(index.values(), key=lambda entry: entry[0])]
+    offered = calculator.courses.values_list('course_id', flat=True)
+
+    return assemble_plan(calculator.calculator_id, compiled, [(c.course_id, c.code, c.units) for c in courses], offered)
+
+
+def assemble_plan(calculator_id, programs, courses, offered=None):
+    """
+    Builds a CalculatorPlan from compiled programs
+    courses holds (course_id, code, units) in bit order,
+    offered the IDs of the courses users can select (every course when None)
+    """
+    units = tuple(units for course_id, code, units in courses)
+    index = {course_id: bit for bit, (course_id, code, units) in enumerate(courses)}
+
+    offered_mask = 0
+    for course_id in (index if offered is None else offered):
+        if course_id in index:
+            offered_mask |= 1 << index[course_id]
+
+    course_programs = [[] for course in courses]
+    for p, program in enumerate(programs):
+        mask = 0
+        for group in program.groups:
+            mask |= all_courses(group.tree)
+        while mask:
+            low = mask & -mask
+            course_programs[low.bit_length() - 1].append(p)
+            mask ^= low
+
+    return CalculatorPlan(
+            calculator_id,
+            tuple(programs),
+            MappingProxyType(index),
+            units,
+            tuple(code for course_id, code, units in courses),
+            build_matrix(programs, units),
+            tuple(tuple(positions) for positions in course_programs),
+            tuple(sum(min_required(group.tree) for group in program.groups) for program in programs),
+            tuple(untouched_result(program) for program in programs),
+            offered_mask,
+            tuple(course_id for course_id, code, units in courses))
+
+
+def untouched_result(program):
+    """ Result of a program for a selection without any of its courses, nothing is completed """
+    # no course is left, so the selection is never looked at
+    required = sum(calculate(group.tree, 0, None)[1] for group in program.groups)
+    return ProgramResult(0, required, (0,) * len(program.groups))
+
+
+def get_calculator_plan(calc_id):
+    """
+    Returns the compiled plan for a calculator, compiling it on first use
+    Raises Calculator.DoesNotExist if there is no such calculator
+    """
+    global _plans_version
+    calc_id = int(calc_id)
+
+    # data was loaded or changed since the plans were compiled
+    version = data_version()
+    if version != _plans_version:
+        _plans.clear()
+        _plans_version = version
+
+    plan = _plans.get(calc_id)
+
+    if plan is None:
+        plan = compile_calculator(Calculator.objects.get(calculator_id=calc_id), version)
+        _plans[calc_id] = plan
+
+    return plan
+
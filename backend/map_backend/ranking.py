@@ -0,0 +1,75 @@
+from .engine import percentage, touched_programs
+
+
+def upper_bounds(plan, selection):
+    """
+    Highest percentage every program could reach with a selection
+
+    A course counts at most once towards a program, so the units completed
+    can't exceed the units of the selected courses the program refers to,
+    and the units required can't be fewer than plan.min_required.
+    """
+    reachable = [0] * len(plan.programs)
+    for bit in selection.order:
+        for p in plan.course_programs[bit]:
+            reachable[p] += plan.units[bit]
+
+    bounds = []
+    for p, units in enumerate(reachable):
+        required = plan.min_required[p]
+        if units == 0:
+            bounds.append(0)
+        elif required == 0:
+            bounds.append(float('inf'))
+        else:
+            # rounded like the reported percentage, rounding never changes the order
+            bounds.append(round(units / required, 2))
+
+    return bounds
+
+
+def rank_programs(plan, selection, evaluate, top_k=None, min_percentage=None):
+    """
+    Evaluates only the programs that can still make the cut
+
+    evaluate(program, selection) returns a ProgramResult.
+    Programs are evaluated from the highest upper bound down, and the search
+    stops once no remaining bound can reach the k-th best percentage.
+    Returns [(program position, result), ...] and the number of programs that
+    were never evaluated. With top_k the results are sorted by percentage
+    (ties keep calculator order), otherwise they keep calculator order.
+    """
+    bounds = upper_bounds(plan, selection)
+    touched = touched_programs(plan, selection)
+    candidates = range(len(plan.programs))
+
+    if min_percentage is not None:
+        candidates = [p for p in candidates if bounds[p] >= min_percentage]
+    if top_k is not None:
+        candidates = sorted(candidates, key=lambda p: (-bounds[p], p))
+
+    def rank(entry):
+        return -percentage(entry[1]), entry[0]
+
+    found = []
+    evaluated = 0
+
+    for p in candidates:
+        # found is sorted and full, nothing left can reach its last entry
+        if top_k is not None and len(found) == top_k and bounds[p] < percentage(found[-1][1]):
+            break
+
+        if p in touched:
+            result = evaluate(plan.programs[p], selection)
+        else:
+            result = plan.untouched[p]
+        evaluated += 1
+        if min_percentage is not None and percentage(result) < min_percentage:
+            continue
+
+        found.append((p, result))
+        if top_k is not None:
+            found.sort(key=rank)
+            del found[top_k:]
+
+    return found, len(plan.programs) - evaluated
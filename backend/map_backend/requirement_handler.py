@@ -2,18 +2,34 @@ AND = 0
 OR = 1
 
 class BinOp:
+    """ A binary node as produced by Parser, see flatten() for the tree used everywhere else """
+    __slots__ = ('left', 'op', 'right')
+
     def __init__(self, left, op, right):
         self.left = left
         self.op = op
         self.right = right
 
     def __str__(self):
-        if self.op == AND:
-            operator = "AND"
-        else:
-            operator = "OR"
+        # rendered bottom up without recursion, Parser nests a long chain of items as deep as it is long
+        rendered = []
+        stack = [(self, False)]
+
+        while stack:
+            node, expanded = stack.pop()
+            if not isinstance(node, BinOp):
+                rendered.append(str(node))
+            elif not expanded:
+                stack.append((node, True))
+                stack.append((node.right, False))
+                stack.append((node.left, False))
+            else:
+                right = rendered.pop()
+                left = rendered.pop()
+                operator = "AND" if node.op == AND else "OR"
+                rendered.append("({}) {} ({})".format(left, operator, right))
 
-        return "({}) {} ({})".format(str(self.left), operator, str(self.right))
+        return rendered[0]
 
 class Parser:
 
@@ -68,3 +84,201 @@ class Parser:
             return self.factor()
         else:
             return self.term()
+
+class Node:
+    """
+    An AND/OR node of a requirement tree, with any number of children
+    Leaves are anything else (Leaf, EquationLeaf, strings, ...)
+    flat is set when every child is a leaf. Nodes are not changed once built
+    """
+    __slots__ = ('op', 'children', 'flat')
+
+    def __init__(self, op, children):
+        self.op = op
+        self.children = children
+        self.flat = not any(isinstance(child, Node) for child in children)
+
+    def __str__(self):
+        # rendered bottom up without recursion, a group can have hundreds of items
+        rendered = []
+        stack = [(self, False)]
+
+        while stack:
+            node, expanded = stack.pop()
+            if not isinstance(node, Node):
+                rendered.append(str(node))
+            elif node.flat:
+                operator = " AND " if node.op == AND else " OR "
+                rendered.append(operator.join("({})".format(child) for child in node.children))
+            elif not expanded:
+                stack.append((node, True))
+                stack.extend((child, False) for child in reversed(node.children))
+            else:
+                parts = rendered[len(rendered) - len(node.children):]
+                del rendered[len(rendered) - len(node.children):]
+                operator = " AND " if node.op == AND else " OR "
+                rendered.append(operator.join("({})".format(part) for part in parts))
+
+        return rendered[0]
+
+
+def leaves(tree):
+    """ Every leaf of a tree, left to right """
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Node):
+            stack.extend(reversed(node.children))
+        else:
+            yield node
+
+
+def flatten(tree):
+    """
+    Converts a Parser tree into Nodes, merging chains of the same operator
+
+    AND chains are merged on either side since they are checked in order.
+    An OR is checked as a left fold (see engine.calculate), which is how
+    Parser nests OR chains, so only an OR on the left of an OR is merged.
+    """
+    if not isinstance(tree, BinOp):
+        return tree
+
+    # (binop, its merged children) with parents before their children
+    found = []
+    pending = [tree]
+
+    while pending:
+        binop = pending.pop()
+        children = []
+        found.append((binop, children))
+
+        # walk down the chain of the same operator
+        stack = [(binop, True)]
+        while stack:
+            node, mergeable = stack.pop()
+            if not isinstance(node, BinOp):
+                children.append(node)
+            elif node.op == binop.op and mergeable:
+                stack.append((node.right, node.op == AND))
+                stack.append((node.left, True))
+            else:
+                children.append(node)
+                pending.append(node)
+
+    built = {}
+    for binop, children in reversed(found):
+        built[id(binop)] = Node(binop.op, [built[id(child)] if isinstance(child, BinOp) else child for child in children])
+
+    return built[id(tree)]
+
+
+def max_deficit(tree):
+    """ Most units a tree can be missing """
+    if not isinstance(tree, Node):
+        return tree.units
+    deficits = [max_deficit(child) for child in tree.children]
+    return sum(deficits) if tree.op == AND else max(deficits)
+
+
+def normalize(tree):
+    """
+    Simplifies a flattened tree of leaves with a units and a mask (empty lists have no bits)
+    without changing what engine.calculate or the solver return for it
+
+      - every empty leaf of an AND is merged into one leaf with their units
+        (or dropped when they need no units), they never use a course
+      - in an OR, a leaf identical to the one before it is dropped
+      - in an OR, an empty leaf is dropped when it can never be picked: a sibling
+        before it always misses fewer units, or the one after it never misses more
+      - nodes left with one child are replaced by it, and merged chains are flattened again
+    """
+    if not isinstance(tree, Node):
+        return tree
+
+    results = []
+    stack = [(tree, False)]
+
+    while stack:
+        node, expanded = stack.pop()
+        if not isinstance(node, Node):
+            results.append(node)
+            continue
+        if not expanded:
+            stack.append((node, True))
+            stack.extend((child, False) for child in reversed(node.children))
+            continue
+
+        children = results[len(results) - len(node.children):]
+        del results[len(results) - len(node.children):]
+
+        # merge chains again, children may have been simplified into the same operator
+        merged = []
+        for i, child in enumerate(children):
+            if isinstance(child, Node) and child.op == node.op and (node.op == AND or i == 0):
+                merged.extend(child.children)
+            else:
+                merged.append(child)
+
+        kept = []
+        if node.op == AND:
+            empty = None
+            for child in merged:
+                if isinstance(child, Node) or child.mask:
+                    kept.append(child)
+                elif empty is None:
+                    empty = child
+                else:
+                    empty = empty._replace(units=empty.units + child.units)
+            if empty is not None and (empty.units or not kept):
+                kept.append(empty)
+        else:
+            # fewest units a kept child can be missing at most
+            lowest = None
+            for i, child in enumerate(merged):
+                if not isinstance(child, Node):
+                    if i > 0 and child == merged[i - 1]:
+                        continue
+                    if not child.mask and child.units:
+                        following = merged[i + 1] if i + 1 < len(merged) else None
+                        if lowest is not None and lowest < child.units:
+                            continue
+                        if following is not None and (isinstance(following, Node) or following.mask) and max_deficit(following) <= child.units:
+                            continue
+                kept.append(child)
+                deficit = max_deficit(child)
+                lowest = deficit if lowest is None else min(lowest, deficit)
+
+        results.append(kept[0] if len(kept) == 1 else Node(node.op, kept))
+
+    return results[0]
+
+
+def build_group(items, connector, make_leaf):
+    """
+    Builds the parse tree for a requirement group, as the items were entered
+    Equations are rendered from it, requirements are checked on flatten(tree)
+
+    We are converting a complex requirement_group
+        Ex. Group connector is OR
+
+        -     |   3 units from List 1
+        AND   |   3 units from List 2
+        OR    |   3 units from List 3
+        AND   |   3 units from List 4
+
+        This is converted to
+        output -> (3 units from L1 AND 3 units from L2) OR (3 units from L3 AND 3 units from L4)
+    """
+    build_requirements = []
+
+    for i, item in enumerate(items):
+        # We skip the connector for the first item
+        if i != 0:
+            build_requirements.append(item.connector)
+
+        build_requirements.append(make_leaf(item))
+
+    # Parser takes in a precedence which is opposite of connector
+    #        -> mosaic's connector is the opposite of the precedence
+    return Parser(build_requirements, not connector).parse()
@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from django.conf import settings
+from .version import data_version
+
+
+class ResultCache:
+    """
+    Serialized SubmitCourseSelections responses of this worker
+
+    Least recently used entries are dropped past RESULT_CACHE_SIZE, entries
+    expire RESULT_CACHE_TTL seconds after they were stored, and everything is
+    dropped when the data version changes.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def check_version(self):
+        version = data_version()
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key):
+        """ Returns the stored response for key, or None """
+        self.check_version()
+        entry = self.entries.get(key)
+
+        if entry is not None and entry[1] <= time.monotonic():
+            del self.entries[key]
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def set(self, key, content):
+        if settings.RESULT_CACHE_SIZE <= 0:
+            return
+
+        self.entries[key] = (content, time.monotonic() + settings.RESULT_CACHE_TTL)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > settings.RESULT_CACHE_SIZE:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0,
+                "evictions": self.evictions,
+                "size": len(self.entries)
+        }
+
+
+# cache of this worker
+result_cache = ResultCache()
+
+
+def result_key(plan, selection, *options):
+    """
+    Cache key of a response
+
+    Results depend on the order courses were selected in, so the key keeps it,
+    without the courses the calculator never refers to and without repeats.
+    options are the request options that change the response
+    """
+    return (plan.calculator_id, tuple(selection.order)) + options
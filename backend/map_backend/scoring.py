@@ -0,0 +1,130 @@
+from collections import namedtuple, defaultdict
+import numpy as np
+from .requirement_handler import Node
+from .engine import ProgramResult, calculate, all_courses, touched_programs
+
+# Incidence structure used to score every program of a calculator at once
+#   weights[bit, row] holds the units of course bit if it is in the list of row
+#   required[row] holds the units needed by row
+#   rows[row] is the (program, group) position of the row, masks[row] its course list
+#   row_program[row] is the program of the row, for summing per program
+#   fixed_required[program] sums required over the rows of a program
+#   tree_groups[program] holds the groups that must be walked as a tree
+Matrix = namedtuple('Matrix', ['weights', 'required', 'rows', 'row_program', 'masks', 'fixed_required', 'tree_groups'])
+
+
+def build_matrix(programs, units):
+    """
+    Splits the groups of every program into matrix rows and tree groups
+
+    A group can be a matrix row when it is a single requirement item whose
+    courses are not shared with any other group of the program.
+    Its result then only depends on which of its courses were selected.
+    Groups with AND/OR items, overlapping course lists or 0 unit courses
+    are left for the tree walk.
+    """
+    zero_units = 0
+    for bit, u in enumerate(units):
+        if u == 0:
+            zero_units |= 1 << bit
+
+    rows = []
+    masks = []
+    required = []
+    fixed_required = []
+    tree_groups = []
+
+    for p, program in enumerate(programs):
+        program_required = 0
+        program_tree_groups = []
+
+        courses = [all_courses(group.tree) for group in program.groups]
+
+        for g, group in enumerate(program.groups):
+            tree = group.tree
+            others = 0
+            for h, mask in enumerate(courses):
+                if h != g:
+                    others |= mask
+
+            if isinstance(tree, Node) or tree.mask & (others | zero_units):
+                program_tree_groups.append(g)
+                continue
+
+            rows.append((p, g))
+            masks.append(tree.mask)
+            required.append(tree.units)
+            program_required += tree.units
+
+        fixed_required.append(program_required)
+        tree_groups.append(tuple(program_tree_groups))
+
+    weights = np.zeros((len(units), len(rows)), dtype=np.int16)
+    for row, mask in enumerate(masks):
+        while mask:
+            low = mask & -mask
+            bit = low.bit_length() - 1
+            weights[bit, row] = units[bit]
+            mask ^= low
+
+    return Matrix(weights, np.array(required, dtype=np.int32), tuple(rows),
+            np.array([p for p, g in rows], dtype=np.intp), tuple(masks), tuple(fixed_required), tuple(tree_groups))
+
+
+def score_calculator(plan, selection):
+    """
+    Checks every program of a calculator against a selection
+
+    Units matched by every matrix row are computed in one pass, rows that
+    could be complete are checked exactly (selection order decides which
+    courses are used). Programs without a selected course are not walked. Returns the same results as engine.evaluate_program,
+    in program order.
+    """
+    matrix = plan.matrix
+
+    if selection.order:
+        completed = matrix.weights[selection.order].sum(axis=0, dtype=np.int32)
+    else:
+        completed = np.zeros(len(matrix.rows), dtype=np.int32)
+
+    # courses used by every row with a match, grouped by program
+    used = defaultdict(list)
+    for row in np.flatnonzero(completed).tolist():
+        p, g = matrix.rows[row]
+        if completed[row] < matrix.required[row]:
+            used[p].append((g, selection.mask & matrix.masks[row]))
+        else:
+            completed_courses, required_courses, left = calculate(plan.programs[p].groups[g].tree, selection.mask, selection)
+            completed[row] = completed_courses
+            used[p].append((g, selection.mask & ~left))
+
+    program_completed = np.bincount(matrix.row_program, weights=completed, minlength=len(plan.programs)).astype(np.int64).tolist()
+
+    results = []
+    touched = touched_programs(plan, selection)
+
+    for p, program in enumerate(plan.programs):
+        # no selected course is in the program, see CalculatorPlan.course_programs
+        if p not in touched:
+            results.append(plan.untouched[p])
+            continue
+
+        total_completed_courses = program_completed[p]
+        total_required_courses = matrix.fixed_required[p]
+        fulfilled = [0] * len(program.groups)
+
+        for g, mask in used.get(p, ()):
+            fulfilled[g] = mask
+
+        # tree groups keep their order, matrix rows never share their courses
+        remaining = selection.mask
+        for g in matrix.tree_groups[p]:
+            completed_courses, required_courses, left = calculate(program.groups[g].tree, remaining, selection)
+            total_completed_courses += completed_courses
+            total_required_courses += required_courses
+            fulfilled[g] = remaining & ~left
+            remaining = left
+
+        results.append(ProgramResult(total_completed_courses, total_required_courses, tuple(fulfilled)))
+
+    return results
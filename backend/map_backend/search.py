@@ -0,0 +1,209 @@
+import re
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from .catalog import get_catalog
+
+# a name trigram found in more than this share of courses doesn't tell them apart, it is skipped
+COMMON_TRIGRAM = 0.02
+# share of the trigrams of a query a name must have to match
+TRIGRAM_THRESHOLD = 0.5
+# names are only matched on trigrams when fewer courses than this matched their code or name prefixes,
+# it doesn't depend on the page asked for so the total stays the same from page to page
+FUZZY_BELOW = 10
+
+# scores of every kind of match, a course gets the best one
+#   code prefix: 3 + up to 1 as the query covers more of the code
+#   subject abbreviation (CS1MD3 for COMPSCI 1MD3): 2 + up to 1 as above
+#   name word prefixes: 1 + up to 1 as the query covers more of the name
+#   name trigrams: the share of the trigrams of the query found in the name
+CODE_SCORE = 3
+ABBREVIATION_SCORE = 2
+WORD_SCORE = 1
+
+# the search index of this worker
+_index = None
+
+NOT_ALPHANUMERIC = re.compile(r'[^A-Z0-9]')
+WORD = re.compile(r'[a-z0-9]+')
+
+
+def normalize_code(code):
+    """ Course code without spaces or punctuation, in upper case: "compsci 1md3" is "COMPSCI1MD3" """
+    return NOT_ALPHANUMERIC.sub('', code.upper())
+
+
+def split_code(code):
+    """ (subject, number) of a normalized code, the subject is every leading letter """
+    number = code.lstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+    return code[:len(code) - len(number)], number
+
+
+def words(text):
+    return WORD.findall(text.lower())
+
+
+def trigrams(text):
+    """ Trigrams of the words of text, each word padded with a space on both sides """
+    found = set()
+    for word in words(text):
+        word = ' {} '.format(word)
+        for i in range(len(word) - 2):
+            found.add(word[i:i + 3])
+    return found
+
+
+def is_abbreviation(letters, subject):
+    """ Whether letters are a shortening of subject: its first letter then some of the others, in order """
+    if not letters or letters[0] != subject[0] or len(letters) >= len(subject):
+        return False
+    position = 1
+    for letter in letters[1:]:
+        position = subject.find(letter, position) + 1
+        if position == 0:
+            return False
+    return True
+
+
+def prefix_range(keys, prefix):
+    """ Positions of the keys of a sorted list starting with prefix, keys are (text, course_id) """
+    start = bisect_left(keys, (prefix,))
+    end = start
+    while end < len(keys) and keys[end][0].startswith(prefix):
+        end += 1
+    return start, end
+
+
+class SearchIndex:
+    """
+    Course autocomplete, held in memory by every worker
+
+    Codes are matched on their prefix once normalized, and the subject of a code
+    may be shortened (CS1MD3, COMPSCI1MD3 and "compsci 1md" all find COMPSCI 1MD3).
+    Names are matched on the prefixes of their words and, failing enough of those,
+    on shared trigrams so small typos still find a course.
+    courses are CourseRecords, see catalog.py
+
+    Name words are bitsets over the courses sorted by name length, the order
+    their word matches rank in, so a search stops once its page is filled.
+    """
+
+    def __init__(self, version, courses):
+        self.version = version
+        self.codes = {}
+        codes = []
+        subjects = defaultdict(list)
+        postings = defaultdict(list)
+        names = {}
+
+        for course in courses:
+            code = normalize_code(course.code)
+            self.codes[course.course_id] = code
+            codes.append((code, course.course_id))
+
+            subject, number = split_code(code)
+            if subject:
+                subjects[subject].append((number, course.course_id))
+
+            names[course.course_id] = set(words(course.name))
+            for trigram in trigrams(course.name):
+                postings[trigram].append(course.course_id)
+
+        self.sorted_codes = sorted(codes)
+
+        # courses by (letters in their name, code), bit i of a word mask is self.order[i]
+        self.name_lengths = {course_id: sum(len(word) for word in name) for course_id, name in names.items()}
+        self.order = sorted(names, key=lambda course_id: (self.name_lengths[course_id], self.codes[course_id]))
+        self.position = {course_id: position for position, course_id in enumerate(self.order)}
+        word_masks = defaultdict(int)
+        for position, course_id in enumerate(self.order):
+            for word in names[course_id]:
+                word_masks[word] |= 1 << position
+        self.vocabulary = sorted(word_masks)
+        self.word_masks = [word_masks[word] for word in self.vocabulary]
+
+        # subjects by their first letter, for abbreviations
+        self.subjects = {subject: sorted(numbers) for subject, numbers in subjects.items()}
+        self.initials = defaultdict(list)
+        for subject in self.subjects:
+            self.initials[subject[0]].append(subject)
+
+        common = max(1, int(len(codes) * COMMON_TRIGRAM))
+        self.postings = {trigram: ids for trigram, ids in postings.items() if len(ids) <= common}
+        self.common = {trigram for trigram, ids in postings.items() if len(ids) > common}
+
+    def search(self, query, limit=None, offset=0):
+        """
+        ([(course_id, score)], total) of the courses matching query
+        Hits are best first, from offset on and at most limit of them, total counts every match
+        """
+        scores = {}
+
+        def found(course_id, score):
+            if score > scores.get(course_id, 0):
+                scores[course_id] = score
+
+        code = normalize_code(query)
+        if code:
+            start, end = prefix_range(self.sorted_codes, code)
+            for full, course_id in self.sorted_codes[start:end]:
+                found(course_id, CODE_SCORE + len(code) / len(full))
+
+            subject, number = split_code(code)
+            if len(subject) >= 2:
+                for other in self.initials.get(subject[0], ()):
+                    if is_abbreviation(subject, other):
+                        numbers = self.subjects[other]
+                        start, end = prefix_range(numbers, number)
+                        for full, course_id in numbers[start:end]:
+                            found(course_id, ABBREVIATION_SCORE + len(code) / len(self.codes[course_id]))
+
+        # every word of the query must start a word of the name
+        query_words = [word for word in words(query) if len(word) >= 2]
+        matched = 0
+        for i, word in enumerate(query_words):
+            start = bisect_left(self.vocabulary, word)
+            mask = 0
+            while start < len(self.vocabulary) and self.vocabulary[start].startswith(word):
+                mask |= self.word_masks[start]
+                start += 1
+            matched = mask if i == 0 else matched & mask
+
+        # courses matched on their code are counted once
+        total = len(scores) + bin(matched).count("1")
+        total -= sum(1 for course_id in scores if matched >> self.position[course_id] & 1)
+        fuzzy = total < FUZZY_BELOW
+
+        # in ranking order, later matches can't make it into the page
+        typed = sum(len(word) for word in query_words)
+        while matched and (fuzzy or limit is None or len(scores) < offset + limit):
+            low = matched & -matched
+            course_id = self.order[low.bit_length() - 1]
+            found(course_id, WORD_SCORE + min(1, typed / max(1, self.name_lengths[course_id])))
+            matched ^= low
+
+        if fuzzy:
+            # common trigrams are left out of the count, trigrams no name has count as missing
+            query_trigrams = trigrams(query) - self.common
+            if len(query_trigrams) >= 2:
+                counts = Counter()
+                for trigram in query_trigrams:
+                    counts.update(self.postings.get(trigram, ()))
+                needed = len(query_trigrams) * TRIGRAM_THRESHOLD
+                for course_id, count in counts.items():
+                    if count >= needed:
+                        found(course_id, count / len(query_trigrams))
+            total = len(scores)
+
+        ranked = sorted(scores.items(), key=lambda hit: (-hit[1], self.codes[hit[0]]))
+        return ranked[offset:offset + limit] if limit is not None else ranked[offset:], total
+
+
+def get_search_index():
+    """ Returns the search index, (re)building it from the catalog when the data version changed """
+    global _index
+    catalog = get_catalog()
+
+    if _index is None or _index.version != catalog.version:
+        _index = SearchIndex(catalog.version, catalog.courses.values())
+
+    return _index
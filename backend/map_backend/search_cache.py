@@ -0,0 +1,158 @@
+import re
+import time
+from collections import OrderedDict
+from django.conf import settings
+from .catalog import get_catalog
+from .version import data_version, read_index_version
+
+# queries made of anything else go to the index, Haystack quotes words with punctuation in them
+CACHEABLE = re.compile(r'^[A-Za-z0-9 ]*$')
+TOKEN = re.compile(r'\w+')
+
+# Whoosh indexes the start of every word of the code and name, from 2 to 15 letters
+# (EdgeNgramField), shorter query words match nothing and longer ones aren't prefixes
+MIN_WORD = 2
+MAX_WORD = 15
+
+
+def cache_key(query):
+    """ Query in lower case with single spaces, None when its results can't be worked out from an earlier query's """
+    if not CACHEABLE.match(query):
+        return None
+    key = " ".join(query.lower().split())
+    query_words = key.split()
+    if not any(len(word) >= MIN_WORD for word in query_words) or any(len(word) > MAX_WORD for word in query_words):
+        return None
+    return key
+
+
+def document_words(code, name):
+    """ Words of the indexed text of a course, as Whoosh splits them """
+    return frozenset(TOKEN.findall("{} {}".format(code, name).lower()))
+
+
+def matches(key, found):
+    """ Whether every word of a query starts one of the words of a course, as Whoosh matches them """
+    for word in key.split():
+        if len(word) >= MIN_WORD and not any(other.startswith(word) for other in found):
+            return False
+    return True
+
+
+class SearchCache:
+    """
+    Every hit of recent Haystack searches of this worker, for autocomplete
+
+    A search with at most SEARCH_CACHE_CANDIDATES hits is kept whole, as
+    (course_id, score) candidates in the order the index ranked them.
+    Hits of a query that extends a kept one ("comp" then "compsci") are among
+    its candidates, so they are filtered from them rather than searched for;
+    they keep the order and scores of the shorter query. The words of a course
+    are worked out once per data version and shared by every search.
+
+    Least recently used searches are dropped once more than SEARCH_CACHE_SIZE
+    candidates are kept (a search without hits counts as one), they expire
+    SEARCH_CACHE_TTL seconds after they were stored, and everything is dropped
+    when the data version or the index version changes.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.words = {}
+        self.version = None
+        self.candidates = 0
+        self.hits = 0
+        self.prefix_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def check_version(self):
+        # hits come from the index, their words from the catalog
+        version = (data_version(), read_index_version()[0])
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def clear(self):
+        self.entries.clear()
+        self.words.clear()
+        self.candidates = 0
+
+    def course_words(self, catalog, course_id):
+        found = self.words.get(course_id)
+        if found is None:
+            # the index may be ahead of this worker's catalog for DATA_VERSION_TTL
+            course = catalog.get(course_id)
+            found = document_words(course.code, course.name) if course is not None else frozenset()
+            self.words[course_id] = found
+        return found
+
+    def lookup(self, key):
+        """ Unexpired candidates stored for key, or None """
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] <= time.monotonic():
+            self.remove(key)
+            entry = None
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, key):
+        """ Candidates of a query, from its own search or filtered from the longest kept prefix of it, or None """
+        self.check_version()
+        if key is None:
+            self.misses += 1
+            return None
+
+        candidates = self.lookup(key)
+        if candidates is not None:
+            self.hits += 1
+            return candidates
+
+        for end in range(len(key) - 1, MIN_WORD - 1, -1):
+            candidates = self.lookup(key[:end])
+            if candidates is not None:
+                self.prefix_hits += 1
+                catalog = get_catalog()
+                candidates = [(course_id, score) for course_id, score in candidates
+                        if matches(key, self.course_words(catalog, course_id))]
+                # the next letter is filtered from this shorter list
+                self.set(key, candidates)
+                return candidates
+
+        self.misses += 1
+        return None
+
+    def set(self, key, candidates):
+        if key is None or settings.SEARCH_CACHE_SIZE <= 0 or len(candidates) > settings.SEARCH_CACHE_CANDIDATES:
+            return
+
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = (candidates, time.monotonic() + settings.SEARCH_CACHE_TTL)
+        self.candidates += max(len(candidates), 1)
+
+        while self.candidates > settings.SEARCH_CACHE_SIZE:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, key):
+        candidates, expiry = self.entries.pop(key)
+        self.candidates -= max(len(candidates), 1)
+
+    def stats(self):
+        lookups = self.hits + self.prefix_hits + self.misses
+        return {
+                "hits": self.hits,
+                "prefixHits": self.prefix_hits,
+                "misses": self.misses,
+                "hitRate": round((self.hits + self.prefix_hits) / lookups, 4) if lookups else 0,
+                "evictions": self.evictions,
+                "size": len(self.entries),
+                "candidates": self.candidates
+        }
+
+
+# cache of this worker
+search_cache = SearchCache()
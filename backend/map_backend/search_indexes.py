@@ -4,6 +4,17 @@ from .models import Course
 class CourseIndex(indexes.SearchIndex, indexes.Indexable):
     text = indexes.EdgeNgramField(document=True, use_template=True)
 
+    # stored with every document so search hits are built without loading courses
+    course_id = indexes.IntegerField(model_attr='course_id', indexed=False)
+    code = indexes.CharField(model_attr='code', indexed=False)
+    name = indexes.CharField(model_attr='name', indexed=False)
+    desc = indexes.CharField(model_attr='desc', indexed=False)
+    # seasons are 0/1, the Whoosh backend reads a stored BooleanField back as always true
+    offered_fall = indexes.IntegerField(model_attr='offered_fall', indexed=False)
+    offered_winter = indexes.IntegerField(model_attr='offered_winter', indexed=False)
+    offered_summer = indexes.IntegerField(model_attr='offered_summer', indexed=False)
+    offered_spring = indexes.IntegerField(model_attr='offered_spring', indexed=False)
+
     def get_model(self):
         return Course
 
@@ -0,0 +1,136 @@
+import uuid
+from collections import OrderedDict
+from django.conf import settings
+from .plans import get_calculator_plan
+from .engine import Selection, evaluate_program, touched_programs
+from .scoring import score_calculator
+from .solver import STRATEGIES, solve_program
+
+# open sessions of this worker, least recently used first
+_sessions = OrderedDict()
+
+
+class SessionError(Exception):
+    """ A change could not be applied to a session """
+    pass
+
+
+class EvaluationSession:
+    """
+    A selection that is edited one course at a time
+
+    The result of every program is kept, and a change only re-evaluates the
+    programs that refer to the changed course (plan.course_programs). Other
+    programs can't be affected since only their own courses, in selection
+    order, decide their result.
+    """
+
+    def __init__(self, calc_id, selected_courses, strategy="greedy"):
+        self.calc_id = calc_id
+        self.strategy = strategy
+        self.selected = []
+        for course in selected_courses:
+            if course not in self.selected:
+                self.selected.append(course)
+        self.evaluate_all()
+
+    def evaluate(self, program):
+        if self.strategy == "optimal":
+            return solve_program(program, self.selection).result
+        return evaluate_program(program, self.selection)
+
+    def evaluate_all(self):
+        self.plan = get_calculator_plan(self.calc_id)
+        self.selection = Selection(self.plan, self.selected)
+        if self.strategy == "optimal":
+            touched = touched_programs(self.plan, self.selection)
+            self.results = [self.evaluate(program) if p in touched else self.plan.untouched[p]
+                    for p, program in enumerate(self.plan.programs)]
+        else:
+            self.results = score_calculator(self.plan, self.selection)
+
+    def apply(self, changes):
+        """
+        Applies changes such as "+123" (add course 123) or "-123" (remove it) in order
+        Returns the positions of the programs that were re-evaluated, in calculator order
+        """
+        selected = list(self.selected)
+        changed = []
+
+        for change in changes:
+            try:
+                sign, course = str(change)[0], int(str(change)[1:])
+            except (IndexError, ValueError):
+                raise SessionError("invalid change")
+
+            if sign == "+" and course not in selected:
+                selected.append(course)
+            elif sign == "-" and course in selected:
+                selected.remove(course)
+            elif sign not in "+-":
+                raise SessionError("invalid change")
+            else:
+                continue
+            changed.append(course)
+
+        if len(selected) > settings.EVALUATION_SESSION_MAX_COURSES:
+            raise SessionError("too many courses")
+
+        self.selected = selected
+
+        # the data changed since the session was created, start over
+        if get_calculator_plan(self.calc_id) is not self.plan:
+            self.evaluate_all()
+            return list(range(len(self.plan.programs)))
+
+        self.selection = Selection(self.plan, self.selected)
+        affected = set()
+        for course in changed:
+            bit = self.plan.index.get(course)
+            if bit is not None:
+                affected.update(self.plan.course_programs[bit])
+
+        affected = sorted(affected)
+        for p in affected:
+            self.results[p] = self.evaluate(self.plan.programs[p])
+
+        return affected
+
+
+def open_session(calc_id, selected_courses, strategy="greedy"):
+    """
+    Starts a session, evicting the least recently used ones past EVALUATION_SESSIONS_MAX
+    Course IDs may be sent as strings, they are converted to ints as changes are
+    Raises Calculator.DoesNotExist if there is no such calculator
+    """
+    if strategy not in STRATEGIES:
+        raise SessionError("invalid strategy")
+    if not isinstance(selected_courses, list) or not all(isinstance(course, (int, str)) for course in selected_courses):
+        raise SessionError("invalid selections")
+    try:
+        selected_courses = [int(course) for course in selected_courses]
+    except ValueError:
+        raise SessionError("invalid selections")
+    if len(selected_courses) > settings.EVALUATION_SESSION_MAX_COURSES:
+        raise SessionError("too many courses")
+
+    session = EvaluationSession(calc_id, selected_courses, strategy)
+    session_id = uuid.uuid4().hex
+    _sessions[session_id] = session
+
+    while len(_sessions) > settings.EVALUATION_SESSIONS_MAX:
+        _sessions.popitem(last=False)
+
+    return session_id, session
+
+
+def get_session(session_id):
+    """ Returns an open session, or None if there is none (or it was evicted) """
+    session = _sessions.get(session_id)
+    if session is not None:
+        _sessions.move_to_end(session_id)
+    return session
+
+
+def close_session(session_id):
+    return _sessions.pop(session_id, None) is not None
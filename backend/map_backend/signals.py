@@ -0,0 +1,16 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from .models import Course, CourseList, RequirementGroup, RequirementItem, Program, Calculator
+from .version import data_changed
+
+
+def connect_signals():
+    """
+    Any change to the data makes this worker's compiled plans, course catalog
+    and stored equations stale once the data version is bumped, see version.py
+    """
+    for model in (Course, CourseList, RequirementGroup, RequirementItem, Program, Calculator):
+        post_save.connect(data_changed, sender=model, dispatch_uid="data_save_{}".format(model.__name__))
+        post_delete.connect(data_changed, sender=model, dispatch_uid="data_delete_{}".format(model.__name__))
+
+    for through in (CourseList.courses.through, Program.requirements.through, Calculator.courses.through, Calculator.programs.through):
+        m2m_changed.connect(data_changed, sender=through, dispatch_uid="data_m2m_{}".format(through.__name__))
@@ -0,0 +1,236 @@
+import time
+from collections import namedtuple
+from .requirement_handler import Node, leaves
+from .engine import AND, ProgramResult, all_courses, evaluate_program, percentage
+
+# ways programs can be evaluated, "greedy" goes through engine.evaluate_program
+STRATEGIES = ("greedy", "optimal")
+
+# default search budget for one program
+MAX_NODES = 20000
+TIME_LIMIT = 0.05
+
+# One way of satisfying (part of) a requirement tree
+#   deficit: units still missing, completed: units counted towards the requirement
+#   used: mask of the courses taken
+#   assignment: ((leaf position, courses mask), ...) for every leaf that was given courses
+Option = namedtuple('Option', ['deficit', 'completed', 'used', 'assignment'])
+
+# Best result for a program, and the courses given to every leaf of every group
+#   assignment[group] is that group's Option.assignment,
+#   a leaf position is its index in the group when read left to right
+Solution = namedtuple('Solution', ['result', 'assignment'])
+
+
+class SolverBudgetExceeded(Exception):
+    """ The search visited more nodes, or took longer, than allowed """
+    pass
+
+
+def popcount(mask):
+    return bin(mask).count("1")
+
+
+def better(a, b):
+    """ Fewer missing units first, then more completed units, then fewer courses """
+    return (a.deficit, -a.completed, popcount(a.used)) < (b.deficit, -b.completed, popcount(b.used))
+
+
+def combine(a, b):
+    return Option(a.deficit + b.deficit, a.completed + b.completed, a.used | b.used, a.assignment + b.assignment)
+
+
+def pareto(options):
+    """ Drops every option for which another one is at least as good while using a subset of its courses """
+    options = sorted(options, key=lambda o: (o.deficit, -o.completed, popcount(o.used)))
+    kept = []
+
+    for o in options:
+        if not any(k.deficit <= o.deficit and k.completed >= o.completed and not k.used & ~o.used for k in kept):
+            kept.append(o)
+
+    return kept
+
+
+class Solver:
+    """
+    Finds the assignment of selected courses to requirement leaves that
+    leaves the fewest units missing for a program (ties go to the most
+    completed units). Unlike the greedy engine, OR branches and shared
+    courses are explored instead of decided in selection order.
+
+    Sub-results are memoized on (tree node, remaining courses of that node).
+    Selected courses with the same units that appear in exactly the same
+    leaves are interchangeable, so only how many of them a leaf takes is searched.
+    """
+
+    def __init__(self, program, selection, max_nodes=MAX_NODES, time_limit=TIME_LIMIT):
+        self.program = program
+        self.selection = selection
+        self.max_nodes = max_nodes
+        self.deadline = time.monotonic() + time_limit
+        self.nodes = 0
+        self.memo = {}
+        self.courses = {}
+        self.positions = {}
+
+        group_leaves = []
+        for requirement in program.groups:
+            self.number_leaves(requirement.tree, group_leaves)
+
+        # selected courses grouped by (units, leaves containing it), in selection order
+        classes = {}
+        self.class_of = {}
+        for bit in selection.order:
+            signature = (selection.plan.units[bit], tuple(i for i, leaf in enumerate(group_leaves) if leaf.mask >> bit & 1))
+            self.class_of[bit] = classes.setdefault(signature, len(classes))
+
+        # courses still usable by the groups from g onwards
+        self.suffix_courses = [0] * (len(program.groups) + 1)
+        for g in reversed(range(len(program.groups))):
+            self.suffix_courses[g] = self.suffix_courses[g + 1] | self.courses_of(program.groups[g].tree)
+
+    def number_leaves(self, tree, found):
+        """ Records the position of every leaf of a group """
+        for position, leaf in enumerate(leaves(tree)):
+            self.positions[id(leaf)] = position
+            found.append(leaf)
+
+    def courses_of(self, tree):
+        mask = self.courses.get(id(tree))
+        if mask is None:
+            mask = self.courses[id(tree)] = all_courses(tree)
+        return mask
+
+    def tick(self):
+        self.nodes += 1
+        if self.nodes > self.max_nodes or (self.nodes % 256 == 0 and time.monotonic() > self.deadline):
+            raise SolverBudgetExceeded()
+
+    def leaf_options(self, leaf, remaining):
+        """ Every way a leaf can take courses without wasting any """
+        req_units = leaf.units
+        matched = remaining & leaf.mask
+
+        if not matched:
+            return [Option(req_units, 0, 0, ())]
+
+        groups = {}
+        for bit in self.selection.order:
+            if matched >> bit & 1:
+                groups.setdefault(self.class_of[bit], []).append(bit)
+        groups = list(groups.values())
+
+        units = self.selection.plan.units
+        position = self.positions[id(leaf)]
+        found = []
+
+        def expand(i, total, used):
+            if i == len(groups) or total >= req_units:
+                assignment = ((position, used),) if used else ()
+                found.append(Option(max(0, req_units - total), min(total, req_units), used, assignment))
+                return
+
+            self.tick()
+            expand(i + 1, total, used)
+
+            for bit in groups[i]:
+                total += units[bit]
+                used |= 1 << bit
+                if total >= req_units:
+                    expand(len(groups), total, used)
+                    return
+                expand(i + 1, total, used)
+
+        expand(0, 0, 0)
+        return pareto(found)
+
+    def options(self, tree, remaining):
+        """ Pareto set of ways to satisfy a tree from the remaining courses """
+        remaining &= self.courses_of(tree)
+        key = (id(tree), remaining)
+
+        cached = self.memo.get(key)
+        if cached is not None:
+            return cached
+
+        self.tick()
+
+        if not isinstance(tree, Node):
+            result = self.leaf_options(tree, remaining)
+        elif tree.op == AND:
+            # every child in turn, with the courses the previous ones left
+            result = [Option(0, 0, 0, ())]
+            for child in tree.children:
+                combined = []
+                for partial in result:
+                    for option in self.options(child, remaining & ~partial.used):
+                        self.tick()
+                        combined.append(combine(partial, option))
+                result = pareto(combined)
+        else:
+            # OR case, any child may be used
+            result = []
+            for child in tree.children:
+                result.extend(self.options(child, remaining))
+            result = pareto(result)
+
+        self.memo[key] = result
+        return result
+
+    def best(self, g, remaining):
+        """ Best options for groups g onwards, as a tuple with one option per group """
+        groups = self.program.groups
+        if g == len(groups):
+            return ()
+
+        remaining &= self.suffix_courses[g]
+        key = ('best', g, remaining)
+
+        cached = self.memo.get(key)
+        if cached is not None:
+            return cached
+
+        result = None
+        result_total = None
+
+        for option in self.options(groups[g].tree, remaining):
+            self.tick()
+            rest = self.best(g + 1, remaining & ~option.used)
+            total = option
+            for other in rest:
+                total = combine(total, other)
+
+            if result is None or better(total, result_total):
+                result = (option,) + rest
+                result_total = total
+
+        self.memo[key] = result
+        return result
+
+    def solve(self):
+        options = self.best(0, self.selection.mask)
+        completed = sum(o.completed for o in options)
+        required = completed + sum(o.deficit for o in options)
+
+        result = ProgramResult(completed, required, tuple(o.used for o in options))
+        return Solution(result, tuple(o.assignment for o in options))
+
+
+def solve_program(program, selection, max_nodes=MAX_NODES, time_limit=TIME_LIMIT):
+    """
+    Optimal result for a program
+    Falls back to the greedy engine (with no assignment) when the budget runs out.
+    The solver leaves the fewest units missing, which isn't always the highest
+    percentage the API reports (an OR branch with a larger requirement may be
+    further along), so the greedy result is returned when its percentage is higher.
+    """
+    greedy = evaluate_program(program, selection)
+    try:
+        solution = Solver(program, selection, max_nodes, time_limit).solve()
+    except SolverBudgetExceeded:
+        return Solution(greedy, None)
+
+    if percentage(greedy) > percentage(solution.result):
+        return Solution(greedy, None)
+    return solution
@@ -0,0 +1,88 @@
+import time
+from collections import namedtuple
+from .engine import ProgramResult, Selection, calculate, percentage
+
+# Gain of selecting one more course, for one program
+Suggestion = namedtuple('Suggestion', ['bit', 'program', 'gain', 'percentage'])
+
+
+class ProgramState:
+    """
+    How the groups of a program were checked against the base selection
+
+    before[g] holds the courses left when group g was checked, completed[g]
+    and required[g] the units of the groups before it. A course first used by
+    group g can't change the groups before it, so only g onwards are checked again.
+    """
+
+    def __init__(self, program, selection):
+        self.before = []
+        self.completed = [0]
+        self.required = [0]
+
+        remaining = selection.mask
+        for group in program.groups:
+            self.before.append(remaining)
+            completed_courses, required_courses, remaining = calculate(group.tree, remaining, selection)
+            self.completed.append(self.completed[-1] + completed_courses)
+            self.required.append(self.required[-1] + required_courses)
+
+        self.percentage = percentage(ProgramResult(self.completed[-1], self.required[-1], ()))
+
+
+def suggest_courses(plan, selected_courses, time_limit, programs=None):
+    """
+    Percentage gained by every program when each offered course is added last to a selection
+
+    The base selection is checked once per program. For a candidate course only
+    the programs that refer to it are checked again, from the first group it is in.
+    Candidates that touch the most programs go first, and candidates are no
+    longer tried once time_limit seconds have passed.
+    programs limits the programs to the given positions.
+    Returns the suggestions with a positive gain, and whether every candidate was tried
+    """
+    deadline = time.monotonic() + time_limit
+    selection = Selection(plan, selected_courses)
+    states = {}
+
+    candidates = []
+    mask = plan.offered & ~selection.mask
+    while mask:
+        low = mask & -mask
+        candidates.append(low.bit_length() - 1)
+        mask ^= low
+    candidates.sort(key=lambda bit: -len(plan.course_programs[bit]))
+
+    found = []
+    for bit in candidates:
+        if time.monotonic() > deadline:
+            return found, False
+
+        added = selection.added(bit)
+        course = 1 << bit
+
+        for p in plan.course_programs[bit]:
+            if programs is not None and p not in programs:
+                continue
+
+            program = plan.programs[p]
+            state = states.get(p)
+            if state is None:
+                state = states[p] = ProgramState(program, selection)
+
+            first = next(g for g, group in enumerate(program.groups) if group.courses & course)
+            completed = state.completed[first]
+            required = state.required[first]
+            remaining = state.before[first] | course
+
+            for group in program.groups[first:]:
+                completed_courses, required_courses, remaining = calculate(group.tree, remaining, added)
+                completed += completed_courses
+                required += required_courses
+
+            new_percentage = percentage(ProgramResult(completed, required, ()))
+            gain = round(new_percentage - state.percentage, 2)
+            if gain > 0:
+                found.append(Suggestion(bit, p, gain, new_percentage))
+
+    return found, True
@@ -1,8 +1,24 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from .models import *
-
+from .plans import get_calculator_plan
+from .engine import Selection, evaluate_program
+from .scoring import score_calculator
+from .version import bump_data_version, data_version
+from .equations import EquationLeaf, refresh_equations, tree_form
+from .indexing import drain_index_queue, last_drain
+from .search_cache import search_cache
+from .requirement_handler import Parser, Node, build_group, flatten, normalize, AND, OR
+from .plans import Leaf
+
+import haystack
 import json
+import gzip
+import shutil
+import tempfile
+from collections import namedtuple
 
 
 class TestGetCourse(TestCase):
@@ -654,3 +670,1610 @@ class TestSameCourseCannotBeUsed(TestCase):
         data = dict(json.loads(response.content))
         # We should be 100% eligible for the program
         self.assertEqual(data['matchedPrograms'][0]['programPercentage'], 0.5)
+
+class TestCompiledPlanQueries(TestCase):
+    """
+    Requirements are compiled once per calculator
+    A second submission should not query the database for requirement data
+    Changing a requirement must drop the compiled plan
+    """
+
+    def setUp(self):
+        self.client = Client()
+        c1 = Course.objects.create(
+                        course_id=1,
+                        code="CHEM 1A03",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+        c2 = Course.objects.create(
+                        course_id=5,
+                        code="CHEM 1AA3",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+
+        p1 = Program.objects.create(
+                        program_id=1,
+                        name="Program",
+                        desc="NA")
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+
+        clist = CourseList(name="test")
+        clist.save()
+        rg = RequirementGroup(order=1)
+        rg.save()
+        self.ri = RequirementItem(parent_group=rg, req_units=6, req_list=clist)
+        self.ri.save()
+
+        clist.courses.add(c1)
+        clist.courses.add(c2)
+        c.courses.add(c1)
+        c.courses.add(c2)
+        c.programs.add(p1)
+        p1.requirements.add(rg)
+
+    def submit(self, selections):
+        data = {"selections" : selections, "calc_id": 1}
+        response = self.client.post('/api/SubmitCourseSelections/',
+                                                                json.dumps(data),
+                                                                content_type="application/json")
+        return dict(json.loads(response.content))
+
+    def test_no_queries_when_compiled(self):
+        self.submit([1])
+        with self.assertNumQueries(0):
+            data = self.submit([1])
+        self.assertEqual(data['matchedPrograms'][0]['programPercentage'], 0.5)
+        self.assertEqual(data['matchedPrograms'][0]['fulfilledCourses'], [["CHEM 1A03"]])
+
+    def test_save_invalidates_plan(self):
+        self.assertEqual(self.submit([1])['matchedPrograms'][0]['programPercentage'], 0.5)
+        self.ri.req_units = 3
+        self.ri.save()
+        self.assertEqual(self.submit([1])['matchedPrograms'][0]['programPercentage'], 1)
+
+class TestSelectionOrderIsKept(TestCase):
+    """
+    Two Requirement Groups that both accept C1 and C2
+    Courses are used in the order they were selected
+    given C2, C1 -> Req1 uses C2 and Req2 uses C1 => 100%
+    """
+
+    def setUp(self):
+        self.client = Client()
+        c1 = Course.objects.create(
+                        course_id=1,
+                        code="CHEM 1A03",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+        c2 = Course.objects.create(
+                        course_id=5,
+                        code="CHEM 1AA3",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+
+        p1 = Program.objects.create(
+                        program_id=1,
+                        name="Program",
+                        desc="NA")
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+
+        clist = CourseList(name="test")
+        clist.save()
+        rg = RequirementGroup(order=1)
+        rg.save()
+        ri = RequirementItem(parent_group=rg, req_units=3, req_list=clist)
+        ri.save()
+        rg2 = RequirementGroup(order=2)
+        rg2.save()
+        ri2 = RequirementItem(parent_group=rg2, req_units=3, req_list=clist)
+        ri2.save()
+
+        clist.courses.add(c1)
+        clist.courses.add(c2)
+        c.courses.add(c1)
+        c.courses.add(c2)
+        c.programs.add(p1)
+        p1.requirements.add(rg)
+        p1.requirements.add(rg2)
+
+    def test_complete_program(self):
+        data = {"selections" : [5, 1], "calc_id": 1}
+        response = self.client.post('/api/SubmitCourseSelections/',
+                                                                json.dumps(data),
+                                                                content_type="application/json")
+        data = dict(json.loads(response.content))
+        self.assertEqual(data['matchedPrograms'][0]['programPercentage'], 1)
+        self.assertEqual(data['matchedPrograms'][0]['fulfilledCourses'], [["CHEM 1AA3"], ["CHEM 1A03"]])
+
+class TestVectorizedScoring(TestCase):
+    """
+    Scoring the whole calculator at once must match checking programs one by one
+    Program 1 -> two groups with their own lists (matrix rows)
+    Program 2 -> two groups sharing a list, and an OR group (tree walk)
+    """
+
+    def setUp(self):
+        courses = []
+        for i in range(1, 7):
+            courses.append(Course.objects.create(
+                        course_id=i,
+                        code="CHEM 1A0{}".format(i),
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry"))
+
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+
+        lists = []
+        for members in ([1, 2], [3, 4], [2, 3, 5], [5, 6]):
+            clist = CourseList(name="test")
+            clist.save()
+            for i in members:
+                clist.courses.add(courses[i - 1])
+            lists.append(clist)
+
+        p1 = Program.objects.create(program_id=1, name="Program", desc="NA")
+        p2 = Program.objects.create(program_id=2, name="Program 2", desc="NA")
+
+        for order, (program, clist, units) in enumerate([(p1, lists[0], 3), (p1, lists[1], 6), (p2, lists[2], 3), (p2, lists[2], 3)]):
+            rg = RequirementGroup(order=order)
+            rg.save()
+            RequirementItem(parent_group=rg, req_units=units, req_list=clist).save()
+            program.requirements.add(rg)
+
+        rg = RequirementGroup(order=5)
+        rg.save()
+        RequirementItem(parent_group=rg, req_units=6, req_list=lists[3]).save()
+        RequirementItem(connector=1, parent_group=rg, req_units=3, req_list=lists[0]).save()
+        p2.requirements.add(rg)
+
+        for course in courses:
+            c.courses.add(course)
+        c.programs.add(p1)
+        c.programs.add(p2)
+
+    def test_same_as_tree_walk(self):
+        plan = get_calculator_plan(1)
+        for selections in ([], [1], [2, 1, 3], [3, 5, 2], [6, 5, 4, 3, 2, 1], [1, 2, 3, 4, 5, 6]):
+            selection = Selection(plan, selections)
+            self.assertEqual(score_calculator(plan, selection), [evaluate_program(program, selection) for program in plan.programs])
+
+class TestOptimalStrategy(TestCase):
+    """
+    Requirement #1 -> Needs C1 or C2
+    Requirement #2 -> Needs C1
+    given C1, C2 the greedy engine uses C1 for Req1 => 50%
+    the optimal strategy uses C2 for Req1 and C1 for Req2 => 100%
+    """
+
+    def setUp(self):
+        self.client = Client()
+        c1 = Course.objects.create(
+                        course_id=1,
+                        code="CHEM 1A03",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+        c2 = Course.objects.create(
+                        course_id=5,
+                        code="CHEM 1AA3",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+
+        p1 = Program.objects.create(
+                        program_id=1,
+                        name="Program",
+                        desc="NA")
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+
+        clist = CourseList(name="test")
+        clist.save()
+        rg = RequirementGroup(order=1)
+        rg.save()
+        ri = RequirementItem(parent_group=rg, req_units=3, req_list=clist)
+        ri.save()
+
+        clist2 = CourseList(name="test")
+        clist2.save()
+        rg2 = RequirementGroup(order=2)
+        rg2.save()
+        ri2 = RequirementItem(parent_group=rg2, req_units=3, req_list=clist2)
+        ri2.save()
+
+        clist.courses.add(c1)
+        clist.courses.add(c2)
+        clist2.courses.add(c1)
+        c.courses.add(c1)
+        c.courses.add(c2)
+        c.programs.add(p1)
+        p1.requirements.add(rg)
+        p1.requirements.add(rg2)
+
+    def submit(self, strategy):
+        data = {"selections" : [1, 5], "calc_id": 1, "strategy": strategy}
+        response = self.client.post('/api/SubmitCourseSelections/',
+                                                                json.dumps(data),
+                                                                content_type="application/json")
+        return dict(json.loads(response.content))['matchedPrograms'][0]
+
+    def test_greedy(self):
+        self.assertEqual(self.submit("greedy")['programPercentage'], 0.5)
+
+    def test_optimal(self):
+        data = self.submit("optimal")
+        self.assertEqual(data['programPercentage'], 1)
+        self.assertEqual(data['fulfilledCourses'], [["CHEM 1AA3"], ["CHEM 1A03"]])
+
+    def test_not_below_greedy(self):
+        # greedy counts every unit of C1 and C2 towards a 2 unit requirement, the solver only counts 2
+        RequirementGroup.objects.get(order=2).delete()
+        RequirementItem.objects.filter(req_units=3).update(req_units=2)
+        bump_data_version()
+        self.assertEqual(self.submit("greedy")['programPercentage'], 3)
+        self.assertEqual(self.submit("optimal")['programPercentage'], 3)
+
+    def test_invalid_strategy(self):
+        for strategy in ("best", ["optimal"], None):
+            for audit in (False, True):
+                data = {"selections" : [1, 5], "calc_id": 1, "strategy": strategy, "audit": audit}
+                response = self.client.post('/api/SubmitCourseSelections/',
+                                                                        json.dumps(data),
+                                                                        content_type="application/json")
+                self.assertEqual(json.loads(response.content), {"error" : "invalid strategy"})
+
+class TestBatchSelections(TestCase):
+    """
+    Evaluates several selection sets in one request
+    Each NDJSON line must match the SubmitCourseSelections response
+    """
+
+    def setUp(self):
+        self.client = Client()
+        c1 = Course.objects.create(
+                        course_id=1,
+                        code="CHEM 1A03",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+        c2 = Course.objects.create(
+                        course_id=5,
+                        code="CHEM 1AA3",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+
+        p1 = Program.objects.create(
+                        program_id=1,
+                        name="Program",
+                        desc="NA")
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+
+        clist = CourseList(name="test")
+        clist.save()
+        rg = RequirementGroup(order=1)
+        rg.save()
+        ri = RequirementItem(parent_group=rg, req_units=6, req_list=clist)
+        ri.save()
+
+        clist.courses.add(c1)
+        clist.courses.add(c2)
+        c.courses.add(c1)
+        c.courses.add(c2)
+        c.programs.add(p1)
+        p1.requirements.add(rg)
+
+        self.batch = [[], [1], [5, 1], list(range(20))]
+
+    def submit(self, selections):
+        data = {"selections" : selections, "calc_id": 1}
+        response = self.client.post('/api/SubmitCourseSelections/',
+                                                                json.dumps(data),
+                                                                content_type="application/json")
+        return dict(json.loads(response.content))
+
+    def submit_batch(self, workers):
+        data = {"selections" : self.batch, "calc_id": 1, "workers": workers}
+        response = self.client.post('/api/SubmitCourseSelectionsBatch/',
+                                                                json.dumps(data),
+                                                                content_type="application/json")
+        self.assertEqual(response['Content-Type'], "application/x-ndjson")
+        return [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+    def test_batch(self):
+        lines = self.submit_batch(1)
+        self.assertEqual(lines, [self.submit(selections) for selections in self.batch])
+        self.assertEqual(lines[2]['matchedPrograms'][0]['programPercentage'], 1)
+        self.assertEqual(lines[3], {"error" : "too many courses"})
+
+    def test_batch_workers(self):
+        self.assertEqual(self.submit_batch(2), self.submit_batch(1))
+
+    def test_invalid_entries(self):
+        # checked before the response starts, the other lines are still evaluated
+        self.batch = [[1], [[1]], "1", [{"id": 1}], [5, 1]]
+        for workers in (1, 2):
+            lines = self.submit_batch(workers)
+            self.assertEqual(lines[1:4], [{"error" : "selections must be a list of course IDs"}] * 3)
+            self.assertEqual([lines[0], lines[4]], [self.submit([1]), self.submit([5, 1])])
+
+    def test_invalid_strategy(self):
+        data = {"selections" : self.batch, "calc_id": 1, "strategy": ["greedy"]}
+        response = self.client.post('/api/SubmitCourseSelectionsBatch/',
+                                                                json.dumps(data),
+                                                                content_type="application/json")
+        self.assertEqual(json.loads(response.content), {"error" : "invalid strategy"})
+
+    def test_no_calc(self):
+        data = {"selections" : self.batch, "calc_id": 2}
+        response = self.client.post('/api/SubmitCourseSelectionsBatch/',
+                                                                json.dumps(data),
+                                                                content_type="application/json")
+        self.assertEqual(json.loads(response.content), {"error": "no such calc_id exists"})
+
+class TestCourseCatalog(TestCase):
+    """
+    Course details are served from the per-worker catalog
+    The catalog is reloaded once the data version is bumped
+    """
+
+    def setUp(self):
+        self.client = Client()
+        Course.objects.create(
+                        course_id=3,
+                        code="CHEM 1A03",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+
+    def get_course(self):
+        response = self.client.get('/api/GetCourseDetails/?courseid=3')
+        return dict(json.loads(response.content))
+
+    def test_no_queries_when_loaded(self):
+        self.get_course()
+        with self.assertNumQueries(0):
+            data = self.get_course()
+        self.assertEqual(data['courseName'], "Chemistry Course")
+
+    def test_bump_reloads(self):
+        self.get_course()
+        # update() sends no signals, like a load done by another worker
+        Course.objects.filter(course_id=3).update(name="Chemistry 1")
+        bump_data_version()
+        self.assertEqual(self.get_course()['courseName'], "Chemistry 1")
+
+class TestStoredEquations(TestCase):
+    """
+    Requirement #1 -> Needs 3 units of C1
+    Equations are rendered and stored by the loaders, requests only render stale ones
+    """
+
+    def setUp(self):
+        self.client = Client()
+        self.c1 = Course.objects.create(
+                        course_id=1,
+                        code="CHEM 1A03",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+
+        p1 = Program.objects.create(
+                        program_id=1,
+                        name="Program",
+                        desc="NA")
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+
+        clist = CourseList(name="test")
+        clist.save()
+        rg = RequirementGroup(order=1)
+        rg.save()
+        self.ri = RequirementItem(parent_group=rg, req_units=3, req_list=clist)
+        self.ri.save()
+
+        clist.courses.add(self.c1)
+        c.courses.add(self.c1)
+        c.programs.add(p1)
+        p1.requirements.add(rg)
+
+    def submit(self):
+        data = {"selections" : [1], "calc_id": 1, "include_tree": True}
+        response = self.client.post('/api/SubmitCourseSelections/',
+                                                                json.dumps(data),
+                                                                content_type="application/json")
+        return dict(json.loads(response.content))['matchedPrograms'][0]['programRequirements']
+
+    def test_tree(self):
+        self.assertEqual(self.submit(), {
+                "requirements": ["3 units of CHEM 1A03"],
+                "tree": [{"units": 3, "courses": ["CHEM 1A03"]}]
+        })
+
+    def test_stored(self):
+        refresh_equations()
+        program = Program.objects.get(program_id=1)
+        self.assertEqual(json.loads(program.equations)["requirements"], ["3 units of CHEM 1A03"])
+        self.assertEqual(program.requirement_equation(), {"requirements": ["3 units of CHEM 1A03"]})
+
+    def test_requests_dont_write(self):
+        # the version bump pending from setUp
+        bump_data_version()
+        with CaptureQueriesContext(connection) as queries:
+            self.submit()
+        self.assertEqual([query["sql"] for query in queries if not query["sql"].startswith("SELECT")], [])
+        self.assertIsNone(Program.objects.get(program_id=1).equations)
+
+    def test_rendered_again_after_change(self):
+        refresh_equations()
+        self.ri.req_units = 6
+        self.ri.save()
+        self.assertEqual(self.submit()["requirements"], ["6 units of CHEM 1A03"])
+        self.assertEqual(Program.objects.get(program_id=1).requirement_equation(), {"requirements": ["6 units of CHEM 1A03"]})
+
+class TestTopKPrograms(TestCase):
+    """
+    Program #1 -> Needs 3 units of C1
+    Program #2 -> Needs 3 units of C2
+    Program #3 -> Needs 6 units of C1, C2
+    given C1 => 100%, 0%, 50%
+    """
+
+    def setUp(self):
+        self.client = Client()
+        c1 = Course.objects.create(
+                        course_id=1,
+                        code="CHEM 1A03",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+        c2 = Course.objects.create(
+                        course_id=5,
+                        code="CHEM 1AA3",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+        c.courses.add(c1)
+        c.courses.add(c2)
+
+        for program_id, units, courses in ((1, 3, [c1]), (2, 3, [c2]), (3, 6, [c1, c2])):
+            p = Program.objects.create(
+                            program_id=program_id,
+                            name="Program {}".format(program_id),
+                            desc="NA")
+            clist = CourseList(name="test")
+            clist.save()
+            rg = RequirementGroup(order=1)
+            rg.save()
+            ri = RequirementItem(parent_group=rg, req_units=units, req_list=clist)
+            ri.save()
+            for course in courses:
+                clist.courses.add(course)
+            p.requirements.add(rg)
+            c.programs.add(p)
+
+    def submit(self, **options):
+        data = {"selections" : [1], "calc_id": 1}
+        data.update(options)
+        response = self.client.post('/api/SubmitCourseSelections/',
+                                                                json.dumps(data),
+                                                                content_type="application/json")
+        return dict(json.loads(response.content))
+
+    def test_top_k(self):
+        data = self.submit(top_k=2)
+        self.assertEqual([(p['programId'], p['programPercentage']) for p in data['matchedPrograms']], [(1, 1), (3, 0.5)])
+        self.assertEqual(data['prunedPrograms'], 1)
+
+    def test_top_1_prunes_by_bound(self):
+        data = self.submit(top_k=1)
+        self.assertEqual([p['programId'] for p in data['matchedPrograms']], [1])
+        self.assertEqual(data['prunedPrograms'], 2)
+
+    def test_min_percentage(self):
+        data = self.submit(min_percentage=0.5)
+        self.assertEqual([p['programId'] for p in data['matchedPrograms']], [1, 3])
+        self.assertEqual(data['prunedPrograms'], 1)
+
+    def test_optimal(self):
+        data = self.submit(top_k=1, strategy="optimal")
+        self.assertEqual([p['programId'] for p in data['matchedPrograms']], [1])
+
+    def test_invalid(self):
+        self.assertEqual(self.submit(top_k=0), {"error" : "invalid top_k or min_percentage"})
+
+    def test_invalid_min_percentage(self):
+        for min_percentage in ("nan", "inf", "-inf", -0.1, 1.5, "half"):
+            self.assertEqual(self.submit(min_percentage=min_percentage), {"error" : "invalid top_k or min_percentage"})
+
+    def test_default_has_every_program(self):
+        data = self.submit()
+        self.assertEqual([p['programId'] for p in data['matchedPrograms']], [1, 2, 3])
+        self.assertNotIn('prunedPrograms', data)
+
+class TestEvaluationSession(TestCase):
+    """
+    Program #1 -> Needs 3 units of C1
+    Program #2 -> Needs 3 units of C2
+    adding or removing C2 only re-evaluates program #2
+    """
+
+    def setUp(self):
+        self.client = Client()
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+
+        for course_id, code in ((1, "CHEM 1A03"), (5, "CHEM 1AA3")):
+            course = Course.objects.create(
+                            course_id=course_id,
+                            code=code,
+                            name="Chemistry Course",
+                            desc="description",
+                            offered_fall=True,
+                            offered_winter=False,
+                            offered_summer=True,
+                            offered_spring=False,
+                            units=3,
+                            department="Chemistry")
+            p = Program.objects.create(
+                            program_id=course_id,
+                            name="Program",
+                            desc="NA")
+            clist = CourseList(name="test")
+            clist.save()
+            rg = RequirementGroup(order=1)
+            rg.save()
+            ri = RequirementItem(parent_group=rg, req_units=3, req_list=clist)
+            ri.save()
+            clist.courses.add(course)
+            p.requirements.add(rg)
+            c.courses.add(course)
+            c.programs.add(p)
+
+    def post(self, url, data):
+        response = self.client.post(url, json.dumps(data), content_type="application/json")
+        return dict(json.loads(response.content))
+
+    def start(self):
+        return self.post('/api/EvaluationSession/', {"calc_id": 1, "selections": [1]})
+
+    def test_start(self):
+        data = self.start()
+        self.assertEqual([p['programPercentage'] for p in data['matchedPrograms']], [1, 0])
+
+    def test_changes(self):
+        session = self.start()['session']
+        data = self.post('/api/EvaluationSession/{}/'.format(session), {"changes": ["+5"]})
+        self.assertEqual(data['selections'], [1, 5])
+        self.assertEqual([(p['programId'], p['programPercentage']) for p in data['updatedPrograms']], [(5, 1)])
+
+        data = self.post('/api/EvaluationSession/{}/'.format(session), {"changes": ["-1"]})
+        self.assertEqual([(p['programId'], p['programPercentage']) for p in data['updatedPrograms']], [(1, 0)])
+
+    def test_invalid_change(self):
+        session = self.start()['session']
+        data = self.post('/api/EvaluationSession/{}/'.format(session), {"changes": ["5"]})
+        self.assertEqual(data, {"error" : "invalid change"})
+
+    def test_invalid_strategy(self):
+        data = self.post('/api/EvaluationSession/', {"calc_id": 1, "selections": [1], "strategy": "fast"})
+        self.assertEqual(data, {"error" : "invalid strategy"})
+
+    def test_string_selections(self):
+        data = self.post('/api/EvaluationSession/', {"calc_id": 1, "selections": ["1"]})
+        self.assertEqual([p['programPercentage'] for p in data['matchedPrograms']], [1, 0])
+        data = self.post('/api/EvaluationSession/{}/'.format(data['session']), {"changes": ["-1"]})
+        self.assertEqual(data['selections'], [])
+
+    def test_invalid_selections(self):
+        for selections in ([[1]], ["CHEM"], [None]):
+            data = self.post('/api/EvaluationSession/', {"calc_id": 1, "selections": selections})
+            self.assertEqual(data, {"error" : "invalid selections"})
+
+    @override_settings(EVALUATION_SESSIONS_MAX=1)
+    def test_least_recently_used_is_evicted(self):
+        first = self.start()['session']
+        self.start()
+        data = self.post('/api/EvaluationSession/{}/'.format(first), {"changes": ["+5"]})
+        self.assertEqual(data, {"error" : "no such session"})
+
+    def test_close(self):
+        session = self.start()['session']
+        response = self.client.delete('/api/EvaluationSession/{}/'.format(session))
+        self.assertEqual(json.loads(response.content), {"closed": True})
+
+class TestCourseRequirements(TestCase):
+    """
+    Program #1 -> Req #1 needs C1 or C2, Req #2 needs C1 (calculator 1)
+    Program #2 -> Needs C2 (calculator 2)
+    """
+
+    def setUp(self):
+        self.client = Client()
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+        courses = []
+        for course_id, code in ((1, "CHEM 1A03"), (5, "CHEM 1AA3")):
+            courses.append(Course.objects.create(
+                            course_id=course_id,
+                            code=code,
+                            name="Chemistry Course",
+                            desc="description",
+                            offered_fall=True,
+                            offered_winter=False,
+                            offered_summer=True,
+                            offered_spring=False,
+                            units=3,
+                            department="Chemistry"))
+            c.courses.add(courses[-1])
+        c1, c2 = courses
+
+        p1 = Program.objects.create(
+                        program_id=1,
+                        name="Program 1",
+                        desc="NA")
+        p2 = Program.objects.create(
+                        program_id=2,
+                        name="Program 2",
+                        desc="NA")
+        c.programs.add(p1)
+        c2_calc = Calculator.objects.create(
+                        calculator_id=2,
+                        title="other calc")
+        c2_calc.programs.add(p2)
+
+        for program, order, units, members in ((p1, 1, 3, [c1, c2]), (p1, 2, 3, [c1]), (p2, 1, 3, [c2])):
+            clist = CourseList(name="test")
+            clist.save()
+            rg = RequirementGroup(order=order)
+            rg.save()
+            ri = RequirementItem(parent_group=rg, req_units=units, req_list=clist)
+            ri.save()
+            for course in members:
+                clist.courses.add(course)
+            program.requirements.add(rg)
+
+    def get(self, query):
+        response = self.client.get('/api/GetCourseRequirements/?' + query)
+        return dict(json.loads(response.content))
+
+    def summary(self, data):
+        return {course['courseID']: [(p['programId'], [r['group'] for r in p['requirements']]) for p in course['programs']]
+                for course in data['courses']}
+
+    def test_courses(self):
+        self.assertEqual(self.summary(self.get('courseid=1,5')), {1: [(1, [0, 1])], 5: [(1, [0])]})
+        item = self.get('courseid=1')['courses'][0]['programs'][0]['requirements'][1]
+        self.assertEqual((item['item'], item['itemId'], item['units']), (0, RequirementItem.objects.get(parent_group__order=2).pk, 3))
+
+    def test_calculator_programs_only(self):
+        self.assertEqual(self.summary(self.get('courseid=1,5&calc_id=2')), {1: [], 5: [(2, [0])]})
+        self.assertEqual(self.get('courseid=5&calc_id=3'), {"error": "no such calc_id exists"})
+
+    def test_invalid(self):
+        self.assertEqual(self.get('courseid=abc'), {"error" : "Invalid Course ID"})
+        self.assertEqual(self.get('courseid=99'), {"error" : "Invalid Course ID"})
+
+    def test_untouched_programs_are_not_walked(self):
+        response = self.client.post('/api/SubmitCourseSelections/',
+                                                                json.dumps({"selections" : [], "calc_id": 1}),
+                                                                content_type="application/json")
+        program = dict(json.loads(response.content))['matchedPrograms'][0]
+        self.assertEqual(program['programPercentage'], 0)
+        self.assertEqual(program['fulfilledCourses'], [[], []])
+
+class TestRequirementTree(TestCase):
+    """
+    Parser trees are flattened into n-ary nodes and simplified before checking
+    """
+
+    def parse(self, tokens, connector):
+        return flatten(Parser(tokens, not connector).parse())
+
+    def test_flatten(self):
+        tree = self.parse(["A", OR, "B", OR, "C", OR, "D"], OR)
+        self.assertEqual(tree.op, OR)
+        self.assertEqual(tree.children, ["A", "B", "C", "D"])
+        self.assertEqual(str(tree), "(A) OR (B) OR (C) OR (D)")
+
+    def test_flatten_keeps_precedence(self):
+        tree = self.parse(["A", AND, "B", OR, "C", AND, "D"], OR)
+        self.assertEqual(str(tree), "((A) AND (B)) OR ((C) AND (D))")
+
+    def test_normalize(self):
+        a, b = Leaf(3, 1), Leaf(3, 2)
+        # identical items next to each other in an OR, an empty list that is never picked
+        self.assertEqual(normalize(self.parse([a, OR, Leaf(3, 1), OR, b, OR, Leaf(6, 0)], OR)).children, [a, b])
+        # empty lists of an AND still need their units
+        tree = normalize(self.parse([a, AND, Leaf(3, 0), AND, b, AND, Leaf(6, 0)], AND))
+        self.assertEqual(tree.children, [a, b, Leaf(9, 0)])
+        self.assertEqual(normalize(self.parse([a, AND, Leaf(0, 0)], AND)), a)
+
+    def test_equations_keep_the_parse(self):
+        # only checking uses the flattened tree, equations are rendered as the items were entered
+        Item = namedtuple('Item', ['connector', 'name'])
+        items = [Item(None, "A"), Item(OR, "B"), Item(OR, "C")]
+        tree = build_group(items, OR, lambda item: item.name)
+        self.assertEqual(str(tree), "((A) OR (B)) OR (C)")
+        self.assertEqual(str(flatten(tree)), "(A) OR (B) OR (C)")
+        # deeper than the recursion limit
+        self.assertTrue(str(build_group([Item(None, "A")] + [Item(AND, "B")] * 2000, OR, lambda item: item.name)).endswith(") AND (B)"))
+
+    def test_tree_form_of_a_long_group(self):
+        Item = namedtuple('Item', ['connector', 'name'])
+        items = [Item(None, "A")] + [Item(AND, "B")] * 2000
+        form = tree_form(build_group(items, OR, lambda item: EquationLeaf(3, [item.name])))
+        self.assertEqual(form["op"], "AND")
+        self.assertEqual(form["children"][1], {"units": 3, "courses": ["B"]})
+
+        form = tree_form(build_group(items[:3], OR, lambda item: EquationLeaf(3, [item.name])))
+        self.assertEqual(form, {"op": "AND", "children": [
+                {"op": "AND", "children": [{"units": 3, "courses": ["A"]}, {"units": 3, "courses": ["B"]}]},
+                {"units": 3, "courses": ["B"]}]})
+
+class TestResultCache(TestCase):
+    """
+    Requirement #1 -> Needs 3 units of C1
+    Identical selections are answered from the worker's result cache
+    """
+
+    def setUp(self):
+        self.client = Client()
+        c1 = Course.objects.create(
+                        course_id=1,
+                        code="CHEM 1A03",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+        p1 = Program.objects.create(
+                        program_id=1,
+                        name="Program",
+                        desc="NA")
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+
+        clist = CourseList(name="test")
+        clist.save()
+        rg = RequirementGroup(order=1)
+        rg.save()
+        self.ri = RequirementItem(parent_group=rg, req_units=3, req_list=clist)
+        self.ri.save()
+
+        clist.courses.add(c1)
+        c.courses.add(c1)
+        c.programs.add(p1)
+        p1.requirements.add(rg)
+
+    def submit(self, selections):
+        data = {"selections" : selections, "calc_id": 1}
+        return self.client.post('/api/SubmitCourseSelections/',
+                                                                json.dumps(data),
+                                                                content_type="application/json")
+
+    def test_hit(self):
+        self.assertEqual(self.submit([1])["X-Cache"], "MISS")
+        response = self.submit([1])
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(json.loads(response.content)['matchedPrograms'][0]['programPercentage'], 1)
+
+    def test_unknown_courses_share_the_entry(self):
+        self.submit([1])
+        self.assertEqual(self.submit([99, 1, 1])["X-Cache"], "HIT")
+
+    def test_data_change_invalidates(self):
+        self.submit([1])
+        self.ri.req_units = 6
+        self.ri.save()
+        response = self.submit([1])
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(json.loads(response.content)['matchedPrograms'][0]['programPercentage'], 0.5)
+
+    @override_settings(RESULT_CACHE_TTL=0)
+    def test_expired(self):
+        self.submit([1])
+        self.assertEqual(self.submit([1])["X-Cache"], "MISS")
+
+    def test_stats(self):
+        before = json.loads(self.client.get('/api/ResultCacheStats/').content)
+        self.submit([1])
+        self.submit([1])
+        after = json.loads(self.client.get('/api/ResultCacheStats/').content)
+        self.assertEqual((after['hits'] - before['hits'], after['misses'] - before['misses']), (1, 1))
+
+class TestSuggestCourses(TestCase):
+    """
+    Program #1 -> Needs 6 units of C1, C2
+    Program #2 -> Needs 3 units of C3
+    given C1, adding C3 gains 100% for program #2 and C2 gains 50% for program #1
+    """
+
+    def setUp(self):
+        self.client = Client()
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+        courses = []
+        for course_id, code in ((1, "CHEM 1A03"), (5, "CHEM 1AA3"), (7, "MATH 1ZA3")):
+            courses.append(Course.objects.create(
+                            course_id=course_id,
+                            code=code,
+                            name="Course",
+                            desc="description",
+                            offered_fall=True,
+                            offered_winter=False,
+                            offered_summer=True,
+                            offered_spring=False,
+                            units=3,
+                            department="Chemistry"))
+            c.courses.add(courses[-1])
+
+        for program_id, units, members in ((1, 6, courses[:2]), (2, 3, courses[2:])):
+            p = Program.objects.create(
+                            program_id=program_id,
+                            name="Program {}".format(program_id),
+                            desc="NA")
+            clist = CourseList(name="test")
+            clist.save()
+            rg = RequirementGroup(order=1)
+            rg.save()
+            ri = RequirementItem(parent_group=rg, req_units=units, req_list=clist)
+            ri.save()
+            for course in members:
+                clist.courses.add(course)
+            p.requirements.add(rg)
+            c.programs.add(p)
+
+    def suggest(self, **options):
+        data = {"selections" : [1], "calc_id": 1}
+        data.update(options)
+        response = self.client.post('/api/SuggestCourses/',
+                                                                json.dumps(data),
+                                                                content_type="application/json")
+        return dict(json.loads(response.content))
+
+    def test_overall(self):
+        data = self.suggest()
+        self.assertEqual([(s['courseID'], s['bestGain'], s['bestProgramId']) for s in data['suggestions']], [(7, 1, 2), (5, 0.5, 1)])
+        self.assertTrue(data['complete'])
+
+    def test_per_program(self):
+        data = self.suggest()
+        self.assertEqual({p['programId']: [(s['courseCode'], s['programPercentage']) for s in p['suggestions']] for p in data['programs']},
+                {1: [("CHEM 1AA3", 1)], 2: [("MATH 1ZA3", 1)]})
+
+    def test_limit_and_programs(self):
+        data = self.suggest(limit=1, program_ids=[1])
+        self.assertEqual([s['courseID'] for s in data['suggestions']], [5])
+
+    def test_invalid_programs(self):
+        for program_ids in (5, None, "1", [1, "2"], [[1]]):
+            self.assertEqual(self.suggest(program_ids=program_ids), {"error" : "invalid request"})
+
+class TestAuditMode(TestCase):
+    """
+    Requirement #1 -> Needs 6 units of C1, C2
+    a transcript of more than 15 courses is only accepted in audit mode
+    """
+
+    def setUp(self):
+        self.client = Client()
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+        p1 = Program.objects.create(
+                        program_id=1,
+                        name="Program",
+                        desc="NA")
+        clist = CourseList(name="test")
+        clist.save()
+        rg = RequirementGroup(order=1)
+        rg.save()
+        ri = RequirementItem(parent_group=rg, req_units=6, req_list=clist)
+        ri.save()
+
+        for course_id in range(1, 31):
+            course = Course.objects.create(
+                            course_id=course_id,
+                            code="COURSE {}".format(course_id),
+                            name="Course",
+                            desc="description",
+                            offered_fall=True,
+                            offered_winter=False,
+                            offered_summer=True,
+                            offered_spring=False,
+                            units=3,
+                            department="Chemistry")
+            c.courses.add(course)
+            if course_id in (20, 25):
+                clist.courses.add(course)
+
+        c.programs.add(p1)
+        p1.requirements.add(rg)
+
+    def submit(self, **options):
+        data = {"selections" : list(range(30, 0, -1)), "calc_id": 1}
+        data.update(options)
+        response = self.client.post('/api/SubmitCourseSelections/',
+                                                                json.dumps(data),
+                                                                content_type="application/json")
+        return dict(json.loads(response.content))
+
+    def test_capped(self):
+        self.assertEqual(self.submit(), {"error" : "too many courses"})
+
+    def test_audit(self):
+        program = self.submit(audit=True)['matchedPrograms'][0]
+        self.assertEqual(program['programPercentage'], 1)
+        # selection order is kept
+        self.assertEqual(program['fulfilledCourses'], [["COURSE 25", "COURSE 20"]])
+
+class TestCourseDataPayload(TestCase):
+    """
+    GetCourseData is built once per data version and served compressed, with an ETag
+    """
+
+    def setUp(self):
+        self.client = Client()
+        self.course = Course.objects.create(
+                        course_id=3,
+                        code="CHEM 1A03",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+        c.courses.add(self.course)
+
+    def test_gzip(self):
+        response = self.client.get('/api/GetCourseData/?calc_id=1', HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content))["calcTitle"], "test calc")
+        self.assertIn("max-age", response["Cache-Control"])
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/GetCourseData/?calc_id=1')["ETag"]
+        response = self.client.get('/api/GetCourseData/?calc_id=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_reload_changes_etag(self):
+        etag = self.client.get('/api/GetCourseData/?calc_id=1')["ETag"]
+        self.course.name = "Chemistry 1"
+        self.course.save()
+        response = self.client.get('/api/GetCourseData/?calc_id=1', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_missing_calculator(self):
+        response = self.client.get('/api/GetCourseData/?calc_id=2')
+        self.assertEqual(json.loads(response.content), {"error": "no such calc_id exists"})
+
+
+class TestCourseDataFilters(TestCase):
+    def setUp(self):
+        self.client = Client()
+        c = Calculator.objects.create(
+                        calculator_id=1,
+                        title="test calc")
+        c.courses.add(Course.objects.create(
+                        course_id=3,
+                        code="CHEM 1A03",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry"))
+        c.courses.add(Course.objects.create(
+                        course_id=4,
+                        code="PHYS 1A03",
+                        name="Physics Course",
+                        desc="description",
+                        offered_fall=False,
+                        offered_winter=True,
+                        offered_summer=False,
+                        offered_spring=False,
+                        units=3,
+                        department="Physics"))
+
+    def test_fields(self):
+        response = self.client.get('/api/GetCourseData/?calc_id=1&fields=courseCode,courseID')
+        data = json.loads(response.content)
+        self.assertEqual(data["courseLists"]["Fall"], {"Chemistry": [{"courseID": 3, "courseCode": "CHEM 1A03"}]})
+
+    def test_season(self):
+        response = self.client.get('/api/GetCourseData/?calc_id=1&season=Winter&fields=courseCode')
+        data = json.loads(response.content)
+        self.assertEqual(data["courseLists"], {"Winter": {"Physics": [{"courseCode": "PHYS 1A03"}]}})
+
+    def test_department(self):
+        response = self.client.get('/api/GetCourseData/?calc_id=1&department=Chemistry&fields=courseCode')
+        data = json.loads(response.content)
+        self.assertEqual(data["courseLists"], {
+                "Spring": {},
+                "Summer": {"Chemistry": [{"courseCode": "CHEM 1A03"}]},
+                "Fall": {"Chemistry": [{"courseCode": "CHEM 1A03"}]},
+                "Winter": {}})
+
+    def test_invalid(self):
+        response = self.client.get('/api/GetCourseData/?calc_id=1&fields=courseUnits')
+        self.assertEqual(json.loads(response.content), {"error": "invalid fields"})
+        response = self.client.get('/api/GetCourseData/?calc_id=1&season=Autumn')
+        self.assertEqual(json.loads(response.content), {"error": "invalid season"})
+
+    def test_stream(self):
+        response = self.client.get('/api/GetCourseData/?calc_id=1&stream=1')
+        self.assertTrue(response.streaming)
+        streamed = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(streamed, json.loads(self.client.get('/api/GetCourseData/?calc_id=1').content))
+
+    def test_stream_filters(self):
+        response = self.client.get('/api/GetCourseData/?calc_id=1&stream=1&season=Fall,Spring&fields=courseCode')
+        self.assertEqual(json.loads(b"".join(response.streaming_content)), {
+                "calcTitle": "test calc",
+                "courseLists": {"Spring": {}, "Fall": {"Chemistry": [{"courseCode": "CHEM 1A03"}]}}})
+
+    @override_settings(COURSE_DATA_CHUNK_SIZE=2)
+    def test_stream_chunk_size(self):
+        # three rows (CHEM in Fall and Summer, PHYS in Winter), two to a chunk
+        response = self.client.get('/api/GetCourseData/?calc_id=1&stream=1&fields=courseCode')
+        chunks = list(response.streaming_content)
+        self.assertEqual([chunk.count(b'"courseCode"') for chunk in chunks], [2, 1])
+
+
+class TestBulkCourseDetails(TestCase):
+    def setUp(self):
+        self.client = Client()
+        for course_id, code in ((3, "CHEM 1A03"), (4, "PHYS 1A03")):
+            Course.objects.create(
+                        course_id=course_id,
+                        code=code,
+                        name="Course",
+                        desc="description of {}".format(code),
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Science")
+
+    def test_get(self):
+        response = self.client.get('/api/GetCourseDetails/?courseids=3,4,5')
+        self.assertEqual(json.loads(response.content), {"courses": {
+                "3": {"courseCode": "CHEM 1A03", "courseName": "Course", "courseDesc": "description of CHEM 1A03"},
+                "4": {"courseCode": "PHYS 1A03", "courseName": "Course", "courseDesc": "description of PHYS 1A03"},
+                "5": {"error": "Invalid Course ID"}}})
+        self.assertIn("max-age", response["Cache-Control"])
+        self.assertEqual(self.client.get('/api/GetCourseDetails/?courseids=3,4,5', HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_post(self):
+        response = self.client.post('/api/GetCourseDetails/', json.dumps({"courseids": [4, "x"]}), content_type="application/json")
+        data = json.loads(response.content)
+        self.assertEqual(data["courses"]["4"]["courseCode"], "PHYS 1A03")
+        self.assertEqual(data["courses"]["x"], {"error": "Invalid Course ID"})
+
+    def test_negotiated_coding_only(self):
+        response = self.client.get('/api/GetCourseDetails/?courseids=3,4', HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content)), json.loads(self.client.get('/api/GetCourseDetails/?courseids=3,4').content))
+        self.assertFalse(self.client.get('/api/GetCourseDetails/?courseids=3,4').has_header("Content-Encoding"))
+
+    @override_settings(COURSE_DETAILS_MAX_IDS=1)
+    def test_limit(self):
+        response = self.client.get('/api/GetCourseDetails/?courseids=3,4')
+        self.assertEqual(json.loads(response.content), {"error": "too many course IDs"})
+
+
+class TestConditionalRequests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.course = Course.objects.create(
+                        course_id=3,
+                        code="CHEM 1A03",
+                        name="Chemistry Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Chemistry")
+        bump_data_version()
+
+    def test_validators(self):
+        response = self.client.get('/api/GetCourseDetails/?courseid=3')
+        self.assertTrue(response["ETag"].startswith('W/"'))
+        self.assertIn("Last-Modified", response)
+
+        response = self.client.get('/api/GetCourseDetails/?courseid=3', HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_payload_etag_kept(self):
+        response = self.client.get('/api/GetCourseDetails/?courseids=3')
+        etag = response["ETag"]
+        self.assertFalse(etag.startswith('W/"'))
+        self.assertIn("Last-Modified", response)
+
+        response = self.client.get('/api/GetCourseDetails/?courseids=3', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_errors_not_validated(self):
+        response = self.client.get('/api/GetCourseDetails/?courseid=4')
+        self.assertEqual(json.loads(response.content), {"error": "Invalid Course ID"})
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+        self.assertNotIn("Cache-Control", response)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get('/api/GetCourseDetails/?courseid=3')["Last-Modified"]
+        response = self.client.get('/api/GetCourseDetails/?courseid=3', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_load_changes_version(self):
+        etag = self.client.get('/api/GetCourseDetails/?courseid=3')["ETag"]
+        bump_data_version()
+        response = self.client.get('/api/GetCourseDetails/?courseid=3', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+@override_settings(SEARCH_ENGINE="memory")
+class TestMemorySearch(TestCase):
+    def setUp(self):
+        self.client = Client()
+        for course_id, code, name in ((1, "COMPSCI 1MD3", "Introduction to Programming"),
+                                      (2, "COMPSCI 2C03", "Data Structures and Algorithms"),
+                                      (3, "CHEM 1A03", "Introductory Chemistry I")):
+            Course.objects.create(
+                        course_id=course_id,
+                        code=code,
+                        name=name,
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Science")
+
+    def search(self, query):
+        response = self.client.get('/api/Search/', {"q": query})
+        return [result["courseCode"] for result in json.loads(response.content)["results"]]
+
+    def test_code_prefix(self):
+        self.assertEqual(self.search("compsci"), ["COMPSCI 1MD3", "COMPSCI 2C03"])
+        self.assertEqual(self.search("COMPSCI 2"), ["COMPSCI 2C03"])
+        self.assertEqual(self.search("chem1a03"), ["CHEM 1A03"])
+
+    def test_abbreviation(self):
+        self.assertEqual(self.search("CS1MD3"), ["COMPSCI 1MD3"])
+        self.assertEqual(self.search("cs 2"), ["COMPSCI 2C03"])
+
+    def test_name(self):
+        self.assertEqual(self.search("intro"), ["CHEM 1A03", "COMPSCI 1MD3"])
+        self.assertEqual(self.search("data struct"), ["COMPSCI 2C03"])
+
+    def test_misspelt_name(self):
+        self.assertEqual(self.search("algoritms"), ["COMPSCI 2C03"])
+
+    def test_page(self):
+        response = json.loads(self.client.get('/api/Search/', {"q": "intro", "limit": 1, "offset": 1}).content)
+        self.assertEqual([result["courseCode"] for result in response["results"]], ["COMPSCI 1MD3"])
+        self.assertEqual(response["total"], 2)
+        self.assertGreater(response["results"][0]["score"], 1)
+
+    def test_reload(self):
+        self.assertEqual(self.search("phys"), [])
+        Course.objects.create(
+                        course_id=4,
+                        code="PHYSICS 1D03",
+                        name="Introductory Mechanics",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=False,
+                        offered_spring=False,
+                        units=3,
+                        department="Physics")
+        self.assertEqual(self.search("phys"), ["PHYSICS 1D03"])
+
+
+class TemporaryIndexTestCase(TestCase):
+    """ Indexes into an empty Whoosh index of its own, the one at HAYSTACK_CONNECTIONS' PATH is left alone """
+
+    def setUp(self):
+        self.index_path = tempfile.mkdtemp()
+        index_connections = {'default': dict(haystack.connections.connections_info['default'], PATH=self.index_path)}
+        self.index_settings = override_settings(HAYSTACK_CONNECTIONS=index_connections)
+        self.index_settings.enable()
+        # Haystack keeps the connections it was loaded with, and a backend of each per thread
+        self.saved_connections = haystack.connections.connections_info
+        haystack.connections.connections_info = index_connections
+        haystack.connections.reload('default')
+
+    def tearDown(self):
+        haystack.connections.connections_info = self.saved_connections
+        haystack.connections.reload('default')
+        self.index_settings.disable()
+        shutil.rmtree(self.index_path, ignore_errors=True)
+
+
+@override_settings(DATA_VERSION_TTL=60)
+class TestSearchQueries(TemporaryIndexTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        # courses are indexed once their transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_courses()
+
+    def create_courses(self):
+        for course_id, code in ((1, "BIOLOGY 1A03"), (2, "BIOLOGY 1M03"), (3, "BIOCHEM 2EE3"), (4, "CHEM 1A03")):
+            Course.objects.create(
+                        course_id=course_id,
+                        code=code,
+                        name="Course {}".format(course_id),
+                        desc="description of {}".format(code),
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Science")
+
+    def search(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            results = json.loads(self.client.get('/api/Search/', {"q": query}).content)["results"]
+        return results, len(queries)
+
+    def test_constant_queries(self):
+        self.search("warm up")
+        one, one_queries = self.search("CHEM")
+        many, many_queries = self.search("BIO")
+
+        self.assertEqual(len(one), 1)
+        self.assertEqual(len(many), 3)
+        self.assertEqual(one_queries, many_queries)
+
+    def test_stored_fields(self):
+        results, queries = self.search("CHEM")
+        self.assertGreater(results[0].pop("score"), 0)
+        self.assertEqual(results, [{
+                "courseID": 4,
+                "courseCode": "CHEM 1A03",
+                "courseName": "Course 4",
+                "courseDesc": "description of CHEM 1A03",
+                "courseFall": True,
+                "courseWinter": False,
+                "courseSummer": True,
+                "courseSpring": False}])
+
+    def test_page(self):
+        response = json.loads(self.client.get('/api/Search/', {"q": "BIO", "limit": 2}).content)
+        self.assertEqual((len(response["results"]), response["total"], response["limit"]), (2, 3, 2))
+
+        rest = json.loads(self.client.get('/api/Search/', {"q": "BIO", "limit": 2, "offset": 2}).content)
+        self.assertEqual((len(rest["results"]), rest["total"]), (1, 3))
+        codes = {result["courseCode"] for result in response["results"] + rest["results"]}
+        self.assertEqual(codes, {"BIOLOGY 1A03", "BIOLOGY 1M03", "BIOCHEM 2EE3"})
+
+    @override_settings(SEARCH_MAX_RESULTS=2)
+    def test_cap(self):
+        response = json.loads(self.client.get('/api/Search/', {"q": "BIO", "limit": 10}).content)
+        self.assertEqual((len(response["results"]), response["limit"]), (2, 2))
+
+    def test_invalid_page(self):
+        response = self.client.get('/api/Search/', {"q": "BIO", "offset": -1})
+        self.assertEqual(json.loads(response.content), {"error": "invalid page"})
+
+
+class TestQueuedIndexing(TemporaryIndexTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+
+    def create_course(self, course_id, code):
+        return Course.objects.create(
+                        course_id=course_id,
+                        code=code,
+                        name="Course",
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Science")
+
+    def search(self, query):
+        response = self.client.get('/api/Search/', {"q": query})
+        return [result["courseCode"] for result in json.loads(response.content)["results"]]
+
+    def test_indexed_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.create_course(1, "BIOLOGY 1A03")
+            self.create_course(2, "BIOLOGY 1M03")
+            # nothing is indexed before the transaction commits
+            self.assertEqual(self.search("BIO"), [])
+        self.assertEqual(IndexQueue.objects.count(), 0)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(sorted(self.search("BIO")), ["BIOLOGY 1A03", "BIOLOGY 1M03"])
+        self.assertEqual(IndexQueue.objects.count(), 0)
+        self.assertEqual(last_drain().documents, 2)
+
+    @override_settings(SEARCH_INDEX_DRAIN_ON_COMMIT=False)
+    def test_drain(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            course = self.create_course(1, "BIOLOGY 1A03")
+            self.create_course(2, "BIOLOGY 1M03")
+        self.assertEqual(IndexQueue.objects.count(), 2)
+        self.assertEqual(self.search("BIO"), [])
+
+        self.assertEqual(drain_index_queue(batch_size=1).documents, 2)
+        self.assertEqual(sorted(self.search("BIO")), ["BIOLOGY 1A03", "BIOLOGY 1M03"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            course.delete()
+        drain_index_queue()
+        self.assertEqual(self.search("BIO"), ["BIOLOGY 1M03"])
+
+
+@override_settings(SEARCH_ENGINE="database")
+class TestDatabaseSearch(TestCase):
+    def setUp(self):
+        self.client = Client()
+        for course_id, code, name in ((1, "COMPSCI 1MD3", "Introduction to Programming"),
+                                      (2, "COMPSCI 2C03", "Data Structures and Algorithms"),
+                                      (3, "CHEM 1A03", "Introductory Chemistry I")):
+            Course.objects.create(
+                        course_id=course_id,
+                        code=code,
+                        name=name,
+                        desc="description",
+                        offered_fall=True,
+                        offered_winter=False,
+                        offered_summer=True,
+                        offered_spring=False,
+                        units=3,
+                        department="Science")
+
+    def search(self, query, **page):
+        response = json.loads(self.client.get('/api/Search/', dict(q=query, **page)).content)
+        return [result["courseCode"] for result in response["results"]], response["total"]
+
+    def test_code(self):
+        self.assertEqual(self.search("COMPSCI 2"), (["COMPSCI 2C03"], 1))
+        self.assertEqual(self.search("compsci1md"), (["COMPSCI 1MD3"], 1))
+
+    def test_name(self):
+        self.assertEqual(self.search("data struct"), (["COMPSCI 2C03"], 1))
+        self.assertEqual(sorted(self.search("intro")[0]), ["CHEM 1A03", "COMPSCI 1MD3"])
+
+    def test_page(self):
+        first, total = self.search("intro", limit=1)
+        second, total = self.search("intro", limit=1, offset=1)
+        self.assertEqual(sorted(first + second), ["CHEM 1A03", "COMPSCI 1MD3"])
+        self.assertEqual(total, 2)
+        self.assertEqual(self.search("intro", offset=5), ([], 2))
+
+    def test_updated(self):
+        Course.objects.filter(course_id=3).update(name="General Chemistry")
+        self.assertEqual(self.search("intro"), (["COMPSCI 1MD3"], 1))
+        Course.objects.filter(course_id=1).delete()
+        self.assertEqual(self.search("intro"), ([], 0))
+
+
+class TestSearchCache(TemporaryIndexTestCase):
+    """ Haystack searches that extend a recent one are filtered from its hits """
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        with self.captureOnCommitCallbacks(execute=True):
+            for course_id, code, name in ((1, "BIOLOGY 1A03", "Cell Biology"),
+                                          (2, "BIOLOGY 1M03", "Biodiversity and Evolution"),
+                                          (3, "BIOCHEM 2EE3", "Metabolism"),
+                                          (4, "CHEM 1A03", "General Chemistry")):
+                self.create_course(course_id, code, name)
+
+    def create_course(self, course_id, code, name):
+        Course.objects.create(
+                    course_id=course_id,
+                    code=code,
+                    name=name,
+                    desc="description",
+                    offered_fall=True,
+                    offered_winter=False,
+                    offered_summer=True,
+                    offered_spring=False,
+                    units=3,
+                    department="Science")
+
+    def search(self, query, **page):
+        response = self.client.get('/api/Search/', dict(q=query, **page))
+        content = json.loads(response.content)
+        return response["X-Cache"], sorted(result["courseCode"] for result in content["results"]), content["total"]
+
+    def stats(self):
+        return json.loads(self.client.get('/api/SearchCacheStats/').content)
+
+    def test_prefix_filtered(self):
+        self.assertEqual(self.search("bio"), ("MISS", ["BIOCHEM 2EE3", "BIOLOGY 1A03", "BIOLOGY 1M03"], 3))
+        # answered without the index
+        haystack.connections['default'].get_backend().clear()
+        self.assertEqual(self.search("biol"), ("HIT", ["BIOLOGY 1A03", "BIOLOGY 1M03"], 2))
+        self.assertEqual(self.search("Biology  cell"), ("HIT", ["BIOLOGY 1A03"], 1))
+        self.assertEqual(self.search("bio 1m"), ("HIT", ["BIOLOGY 1M03"], 1))
+        hit, codes, total = self.search("bio", limit=1, offset=2)
+        self.assertEqual((hit, len(codes), total), ("HIT", 1, 3))
+
+    def test_same_hits_as_the_index(self):
+        for query in ("bio", "biol", "bio 1", "bio ev", "bio 1a03", "biox", "chem", "chem gen"):
+            self.search("b")
+            self.search("bi")
+            self.search("c")
+            self.search("ch")
+            cached = self.search(query)
+            search_cache.clear()
+            with override_settings(SEARCH_CACHE_SIZE=0):
+                cold = self.search(query)
+            self.assertEqual(cached, ("HIT",) + cold[1:])
+
+    def test_data_change(self):
+        self.search("biol")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_course(5, "BIOLOGY 2B03", "Genetics")
+        self.assertEqual(self.search("biol")[0::2], ("MISS", 3))
+
+    @override_settings(SEARCH_INDEX_DRAIN_ON_COMMIT=False)
+    def test_drain_keeps_data_version(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_course(5, "BIOLOGY 2B03", "Genetics")
+        stamp = data_version()
+        etag = self.client.get('/api/Search/', {"q": "biol"})["ETag"]
+
+        drain_index_queue()
+        # plans, payloads and stored equations of the data version are still current
+        self.assertEqual(data_version(), stamp)
+        response = self.client.get('/api/Search/', {"q": "biol"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response["X-Cache"], json.loads(response.content)["total"]), ("MISS", 3))
+
+    def test_not_kept(self):
+        # punctuation goes to the index as it is, so does a query of single letters
+        self.search("bio.")
+        self.assertEqual(self.search("bio.l")[0], "MISS")
+        self.search("b")
+        self.assertEqual(self.search("b")[0], "MISS")
+        # only the first page is read with every hit
+        self.search("chem", offset=1)
+        self.assertEqual(self.search("chem")[0], "MISS")
+
+    @override_settings(SEARCH_CACHE_CANDIDATES=2)
+    def test_too_many_hits(self):
+        self.search("bio")
+        self.assertEqual(self.search("biol")[0], "MISS")
+        self.assertEqual(self.search("biolo")[0], "HIT")
+
+    @override_settings(SEARCH_CACHE_SIZE=5)
+    def test_bounded(self):
+        before = self.stats()
+        self.search("bio")
+        self.search("chem")
+        # filtered from "bio", 2 more candidates drop "chem", the least recently used
+        self.assertEqual(self.search("biol")[0], "HIT")
+        after = self.stats()
+        self.assertEqual(after["evictions"] - before["evictions"], 1)
+        self.assertEqual((after["size"], after["candidates"]), (2, 5))
+        self.assertEqual(self.search("chem")[0], "MISS")
+
+    def test_stats(self):
+        before = self.stats()
+        self.search("bio")
+        self.search("bio")
+        self.search("biol")
+        after = self.stats()
+        self.assertEqual([after[key] - before[key] for key in ("hits", "prefixHits", "misses")], [1, 1, 1])
@@ -15,11 +15,20 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
-from .views import GetCourseData, GetCourseDetails, SubmitCourseSelections, SearchCourse
+from .views import GetCourseData, GetCourseDetails, SubmitCourseSelections, SubmitCourseSelectionsBatch, SearchCourse
+from .views import EvaluationSessionStart, EvaluationSessionChange, GetCourseRequirements, ResultCacheStats, SuggestCourses
+from .views import SearchCacheStats
 
 urlpatterns = [
         path('GetCourseData/', GetCourseData.as_view()),
         path('GetCourseDetails/', GetCourseDetails.as_view()),
+        path('GetCourseRequirements/', GetCourseRequirements.as_view()),
         path('SubmitCourseSelections/', SubmitCourseSelections.as_view()),
-        path('Search/', SearchCourse.as_view())
+        path('SubmitCourseSelectionsBatch/', SubmitCourseSelectionsBatch.as_view()),
+        path('ResultCacheStats/', ResultCacheStats.as_view()),
+        path('SuggestCourses/', SuggestCourses.as_view()),
+        path('EvaluationSession/', EvaluationSessionStart.as_view()),
+        path('EvaluationSession/<str:session_id>/', EvaluationSessionChange.as_view()),
+        path('Search/', SearchCourse.as_view()),
+        path('SearchCacheStats/', SearchCacheStats.as_view())
 ]
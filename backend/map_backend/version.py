@@ -0,0 +1,99 @@
+import time
+import uuid
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from .models import DataVersion
+
+# DataVersion rows: the loaded data, and the search index, which changes when its queue is drained
+DATA = 1
+SEARCH_INDEX = 2
+
+# {row: (stamp, time of the change, monotonic time it was read at)}
+_cached = {}
+# data was changed by this process since the last bump
+_pending = False
+
+
+def read_version(pk):
+    """ (stamp, time of the change) of a DataVersion row, re-read at most every DATA_VERSION_TTL seconds """
+    now = time.monotonic()
+    cached = _cached.get(pk)
+
+    if cached is None or now - cached[2] >= settings.DATA_VERSION_TTL:
+        stamp, updated = DataVersion.objects.filter(pk=pk).values_list('stamp', 'updated').first() or ("", None)
+        cached = _cached[pk] = (stamp, updated, now)
+
+    return cached[0], cached[1]
+
+
+def bump_version(pk):
+    """ Gives a DataVersion row a new stamp, returns it """
+    stamp = uuid.uuid4().hex
+    now = timezone.now()
+
+    if not DataVersion.objects.filter(pk=pk).update(version=F('version') + 1, stamp=stamp, updated=now):
+        DataVersion.objects.create(pk=pk, version=1, stamp=stamp, updated=now)
+
+    _cached[pk] = (stamp, now, time.monotonic())
+    return stamp
+
+
+def read_data_version():
+    """ (stamp, time of the load) of the loaded data """
+    if _pending:
+        bump_data_version()
+    return read_version(DATA)
+
+
+def data_version():
+    """
+    Stamp of the loaded data, shared by every worker through the database
+    "" until data is first loaded
+    """
+    return read_data_version()[0]
+
+
+def data_updated():
+    """ When data was last loaded, None until it is first loaded """
+    return read_data_version()[1]
+
+
+def bump_data_version():
+    """ Marks every cache built from the data as stale, in every worker. Called by the loaders """
+    global _pending
+    _pending = False
+    return bump_version(DATA)
+
+
+def read_index_version():
+    """ (stamp, time of the last drain that changed it) of the search index, ("", None) until it is first drained """
+    return read_version(SEARCH_INDEX)
+
+
+def bump_index_version():
+    """ Marks searches of the index as stale, in every worker. Called when its queue is drained """
+    return bump_version(SEARCH_INDEX)
+
+
+def read_search_version():
+    """
+    (stamp, time of the last change) of Search responses, which depend on both the loaded data and the index
+    ("", None) until data is first loaded
+    """
+    stamp, updated = read_data_version()
+    index_stamp, index_updated = read_index_version()
+    if not stamp:
+        return "", None
+    if index_updated is not None and index_updated > updated:
+        updated = index_updated
+    return "{}-{}".format(stamp, index_stamp) if index_stamp else stamp, updated
+
+
+def data_changed(*args, **kwargs):
+    """
+    Signal receiver for saved/deleted data
+    The version is bumped once, the next time it is read, rather than on every save
+    """
+    global _pending
+    _pending = True
@@ -1,20 +1,39 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views import View
 from django.core import serializers
 from collections import defaultdict
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from  django.core.exceptions import ObjectDoesNotExist
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
 from haystack.query import SearchQuerySet
-from .requirement_handler import BinOp, Parser
 import json
+import multiprocessing
+import os
 from django.core import management
 import time
 import bs4, re
 from urllib.request import urlopen as uReq
 from bs4 import BeautifulSoup as soup
 from .models import Course, Program, RequirementGroup, RequirementItem, Calculator
+from .plans import get_calculator_plan
+from .catalog import get_catalog
+from .search import get_search_index
+from .db_search import search_courses
+from .search_cache import search_cache, cache_key
+from .engine import Selection, evaluate_program, percentage, touched_programs
+from .scoring import score_calculator
+from .solver import STRATEGIES, solve_program
+from .ranking import rank_programs
+from .sessions import SessionError, open_session, get_session, close_session
+from .results import result_cache, result_key
+from .suggestions import suggest_courses
+from .conditional import cacheable, data_version_conditional, search_version_conditional
+from .payloads import payload_cache, one_off_payload, payload_response
+from .equations import refresh_equations
 
 AND = 0
 OR = 1
@@ -62,103 +81,306 @@ class Load(View):
         if request.user.is_authenticated:
             try:
                 management.call_command('write_data', json.loads(request.body)['catalog'], verbosity=0)
-                management.call_command('load_courses', 'courses.json', verbosity=1)
-                management.call_command('load_courselist', 'course_list.json', verbosity=1)
-                management.call_command('load_programs', 'programs.json', verbosity=1)
-                management.call_command('load_requirements', 'requirements.json', verbosity=1)
-                management.call_command('load_calculator', 'courses.json', 'programs.json', verbosity=1)
+                management.call_command('load_courses', 'courses.json', verbosity=1, skip_equations=True)
+                management.call_command('load_courselist', 'course_list.json', verbosity=1, skip_equations=True)
+                management.call_command('load_programs', 'programs.json', verbosity=1, skip_equations=True)
+                management.call_command('load_requirements', 'requirements.json', verbosity=1, skip_equations=True)
+                management.call_command('load_calculator', 'courses.json', 'programs.json', verbosity=1, skip_equations=True)
+                # once every loader ran, rather than after each of them
+                refresh_equations()
                 return JsonResponse({'authenticated': 'yes', 'successful': 'yes'})
             except Exception as e:
                 return JsonResponse({'authenticated': 'yes', 'successful': 'no', 'msg': str(e)})
         else:
             return JsonResponse({'authenticated': 'no'})
 
+def search_hit(course, desc, score):
+    """ Search response of one course, course is a CourseRecord or a search result with the same stored fields """
+    return {
+            "score": round(score, 4),
+            "courseID": course.course_id,
+            "courseCode": course.code,
+            "courseName": course.name,
+            "courseDesc": desc,
+            "courseFall": bool(course.offered_fall),
+            "courseWinter": bool(course.offered_winter),
+            "courseSummer": bool(course.offered_summer),
+            "courseSpring": bool(course.offered_spring)
+    }
+
+# /api/Search?q=<query>
+# optional limit (at most SEARCH_MAX_RESULTS, the default) and offset page through the results,
+# every hit has its relevance score and total counts every match.
+# goes through Haystack, the in-memory index of search.py when SEARCH_ENGINE is "memory",
+# or the database's own full-text search (db_search.py) when it is "database"
+# Haystack searches are cached by each worker so autocomplete keystrokes are filtered from the last
+# one's hits, the X-Cache header is HIT or MISS, see search_cache.py
 class SearchCourse(View):
 
+    @method_decorator(search_version_conditional)
     def get(self, request):
         query = request.GET.get('q', '')
 
         if len(query) > 30:
             return JsonResponse({"error" : "long query"})
 
-        res = SearchQuerySet().filter(content=query)
-        suggestions = []
+        try:
+            limit = int(request.GET.get('limit', settings.SEARCH_MAX_RESULTS))
+            offset = int(request.GET.get('offset', 0))
+        except ValueError:
+            return JsonResponse({"error" : "invalid page"})
+        if limit < 1 or offset < 0:
+            return JsonResponse({"error" : "invalid page"})
+        limit = min(limit, settings.SEARCH_MAX_RESULTS)
 
-        for course in res:
-            course_data = {
-                    "courseID": course.object.course_id,
-                    "courseCode": course.object.code,
-                    "courseName": course.object.name,
-                    "courseDesc": course.object.desc,
-                    "courseFall": course.object.offered_fall,
-                    "courseWinter": course.object.offered_winter,
-                    "courseSummer": course.object.offered_summer,
-                    "courseSpring": course.object.offered_spring
-            }
+        suggestions = []
+        cache_status = None
 
-            suggestions.append(course_data)
+        if settings.SEARCH_ENGINE in ("memory", "database"):
+            catalog = get_catalog()
+            if settings.SEARCH_ENGINE == "memory":
+                hits, total = get_search_index().search(query, limit, offset)
+            else:
+                hits, total = search_courses(query, limit, offset)
+            for course_id, score in hits:
+                # the database may be ahead of this worker's catalog for DATA_VERSION_TTL
+                course = catalog.get(course_id)
+                if course is not None:
+                    suggestions.append(search_hit(course, catalog.description(course_id), score))
+        else:
+            key = cache_key(query)
+            candidates = search_cache.get(key)
+            cache_status = "HIT" if candidates is not None else "MISS"
+
+            if candidates is None:
+                # only the page is read from the index, the count comes with it. The first page of a
+                # query that can be kept is read with up to SEARCH_CACHE_CANDIDATES hits, so they are
+                # kept for the next keystrokes without searching the index again
+                results = SearchQuerySet().filter(content=query)
+                keep = key is not None and offset == 0
+                if keep:
+                    read = results[0:max(limit, settings.SEARCH_CACHE_CANDIDATES)]
+                else:
+                    read = results[offset:offset + limit]
+                # hits are built from the fields stored in the index, courses are never loaded
+                for result in read[:limit]:
+                    suggestions.append(search_hit(result, result.desc, result.score))
+                total = results.count()
+
+                if keep and total <= settings.SEARCH_CACHE_CANDIDATES:
+                    search_cache.set(key, [(result.course_id, result.score) for result in read])
+            else:
+                catalog = get_catalog()
+                for course_id, score in candidates[offset:offset + limit]:
+                    course = catalog.get(course_id)
+                    if course is not None:
+                        suggestions.append(search_hit(course, catalog.description(course_id), score))
+                total = len(candidates)
 
         response_data = {
-                'results' : suggestions # in list to maintain order/ranking
+                'results' : suggestions, # in list to maintain order/ranking
+                'total': total,
+                'offset': offset,
+                'limit': limit
         }
 
-        return JsonResponse(response_data)
+        response = JsonResponse(response_data)
+        if cache_status is not None:
+            response["X-Cache"] = cache_status
+        return cacheable(response)
+
+# /api/SearchCacheStats
+# hit/miss counters of the Search cache of the worker that answers, see search_cache.py
+class SearchCacheStats(View):
+
+    def get(self, request):
+        return JsonResponse(search_cache.stats())
+
+# GetCourseData response keys of a course and the column each one comes from
+COURSE_FIELDS = {
+        "courseID": "course_id",
+        "courseCode": "code",
+        "courseName": "name",
+        "courseDesc": "desc"
+}
+
+# seasons of GetCourseData, in response order, and the column telling if a course is offered then
+SEASONS = {
+        "Spring": "offered_spring",
+        "Summer": "offered_summer",
+        "Fall": "offered_fall",
+        "Winter": "offered_winter"
+}
+
+def course_data_query(calc_id, seasons, departments):
+    """ Title of a calculator and its courses in the given seasons and departments, raises Calculator.DoesNotExist """
+    calculator = Calculator.objects.only('title').get(calculator_id=calc_id)
+
+    courses = calculator.courses.all()
+    if departments is not None:
+        courses = courses.filter(department__in=departments)
+    if len(seasons) < len(SEASONS):
+        offered = Q()
+        for season in seasons:
+            offered |= Q(**{SEASONS[season]: True})
+        courses = courses.filter(offered)
+
+    return calculator.title, courses
+
+def build_course_data(calc_id, fields=tuple(COURSE_FIELDS), seasons=tuple(SEASONS), departments=None):
+    """
+    Builds the GetCourseData response for a calculator, raises Calculator.DoesNotExist
+    Only the columns needed for fields and seasons are read, descriptions only when asked for
+    """
+    title, courses = course_data_query(calc_id, seasons, departments)
+
+    columns = ['department'] + [SEASONS[season] for season in seasons] + [COURSE_FIELDS[field] for field in fields]
+
+    # need to build json object to send back that matches the API spec
+    response_data = {
+            "calcTitle" : title,
+            "courseLists": {season: defaultdict(list) for season in seasons}
+    }
+    # iterate over courses
+    for course in courses.values(*columns):
+        # build the course data
+        course_data = {field: course[COURSE_FIELDS[field]] for field in fields}
+
+        # insert into the response based on season, department
+        for season in seasons:
+            if course[SEASONS[season]]:
+                response_data['courseLists'][season][course['department']].append(course_data)
+
+    return response_data
+
+def stream_course_data(title, courses, fields, seasons, chunk_size):
+    """
+    The GetCourseData response as chunks of JSON text
+
+    Every season is one query ordered by department, read chunk_size rows at a time
+    with iterator(), so only one chunk of courses is in memory whatever the calculator size.
+    """
+    columns = ['department'] + [COURSE_FIELDS[field] for field in fields]
+    parts = ['{"calcTitle": ', json.dumps(title), ', "courseLists": {']
+    # rows in parts, a chunk is sent every chunk_size of them
+    buffered = 0
+
+    for s, season in enumerate(seasons):
+        if s != 0:
+            parts.append(', ')
+        parts.extend((json.dumps(season), ': {'))
+
+        department = None
+        rows = courses.filter(**{SEASONS[season]: True}).order_by('department', 'course_id').values_list(*columns)
+        for row in rows.iterator(chunk_size=chunk_size):
+            if row[0] != department:
+                # closes the list of the previous department
+                if department is not None:
+                    parts.append('], ')
+                department = row[0]
+                parts.extend((json.dumps(department), ': ['))
+            else:
+                parts.append(', ')
+            parts.append(json.dumps(dict(zip(fields, row[1:]))))
+            buffered += 1
+
+            if buffered >= chunk_size:
+                yield ''.join(parts)
+                parts = []
+                buffered = 0
+
+        if department is not None:
+            parts.append(']')
+        parts.append('}')
+
+    parts.append('}}')
+    yield ''.join(parts)
+
+def query_list(request, name, allowed=None):
+    """ Comma separated values of a query parameter, None when it isn't given. Raises ValueError for values not in allowed """
+    value = request.GET.get(name, '')
+    if value == '':
+        return None
+
+    values = [v.strip() for v in value.split(',') if v.strip()]
+    if allowed is not None and any(v not in allowed for v in values):
+        raise ValueError(name)
+    return values
 
 # /api/GetCourseData?calc_id=<id>
+# optional fields=courseID,courseCode,... only includes these keys for every course (all of them by default),
+# leave out courseDesc and get descriptions from GetCourseDetails when they are shown.
+# optional season=Fall,Winter and department=Chemistry,... only include these seasons and departments.
+# optional stream=1 sends the response as it is read from the database (for very large calculators),
+# courses are then ordered by department and course_id and the response isn't cached.
+# the response is built once per data version and sent gzip/brotli compressed when accepted,
+# see payloads.py, with an ETag hashed from the payload. Like every read endpoint it has the
+# Last-Modified of the data version, see conditional.py
 class GetCourseData(View):
 
+    @method_decorator(data_version_conditional)
     def get(self, request):
         # calc_id to filter by
         calc_id = request.GET.get('calc_id', '')
+        if calc_id == "": # default to 1
+            calc_id = "1"
 
         try:
-            if calc_id == "": # default to 1
-                courses = Calculator.objects.get(calculator_id=1).courses.all()
-                title = Calculator.objects.get(calculator_id=1).title
-            else:
-                courses = Calculator.objects.get(calculator_id=calc_id).courses.all()
-                title = Calculator.objects.get(calculator_id=calc_id).title
-        except ObjectDoesNotExist:
+            fields = query_list(request, 'fields', COURSE_FIELDS) or list(COURSE_FIELDS)
+            seasons = query_list(request, 'season', SEASONS) or list(SEASONS)
+            departments = query_list(request, 'department')
+        except ValueError as e:
+            return JsonResponse({"error": "invalid {}".format(e)})
+
+        # same order whatever order they were given in, so they share a payload
+        fields = tuple(field for field in COURSE_FIELDS if field in fields)
+        seasons = tuple(season for season in SEASONS if season in seasons)
+        departments = tuple(sorted(set(departments))) if departments is not None else None
+
+        if request.GET.get('stream', '') == '1':
+            try:
+                title, courses = course_data_query(calc_id, seasons, departments)
+            except (ObjectDoesNotExist, ValueError):
+                return JsonResponse({"error": "no such calc_id exists"})
+            chunks = stream_course_data(title, courses, fields, seasons, settings.COURSE_DATA_CHUNK_SIZE)
+            return cacheable(StreamingHttpResponse(chunks, content_type="application/json"))
+
+        try:
+            payload = payload_cache.get(("GetCourseData", calc_id, fields, seasons, departments),
+                    lambda: build_course_data(calc_id, fields, seasons, departments))
+        except (ObjectDoesNotExist, ValueError):
             return JsonResponse({"error": "no such calc_id exists"})
 
-        # need to build json object to send back that matches the API spec
-        response_data = {
-                "calcTitle" : title,
-                "courseLists": {
-                        "Spring": defaultdict(list),
-                        "Summer": defaultdict(list),
-                        "Fall": defaultdict(list),
-                        "Winter": defaultdict(list)
-                }
-        }
-        # iterate over courses
-        for course in courses:
-            # build the course data
-            course_data = {
-                    "courseID": course.course_id,
-                    "courseCode": course.code,
-                    "courseName": course.name,
-                    "courseDesc": course.desc
-            }
-
-            # insert into the response based on season, department
-            if course.offered_fall:
-                response_data['courseLists']["Fall"][course.department].append(course_data)
-            if course.offered_winter:
-                response_data['courseLists']["Winter"][course.department].append(course_data)
-            if course.offered_summer:
-                response_data['courseLists']["Summer"][course.department].append(course_data)
-            if course.offered_spring:
-                response_data['courseLists']["Spring"][course.department].append(course_data)
-
-        # return data
-        return JsonResponse(response_data)
+        return payload_response(request, payload)
+
+def course_details(catalog, course):
+    """ GetCourseDetails response of one course """
+    response_data = defaultdict(str)
+
+    response_data["courseCode"] = course.code
+    response_data["courseName"] = course.name
+    response_data["courseDesc"] = catalog.description(course.course_id)
+
+    return response_data
 
 # Request:
 # /api/GetCourseDetails?courseid=1234567
+# or for many courses at once /api/GetCourseDetails?courseids=1234567,7654321,
+# or a POST with a body of {"courseids": [1234567, 7654321]} for longer lists.
+# Many courses are returned as {"courses": {<course id>: <details or error>}}, at most
+# COURSE_DETAILS_MAX_IDS of them, with the cache headers of GetCourseData
 class GetCourseDetails(View):
 
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        return super(GetCourseDetails, self).dispatch(request, *args, **kwargs)
+
+    @method_decorator(data_version_conditional)
     def get(self, request):
+        course_ids = request.GET.get('courseids', '')
+        if course_ids != "":
+            return self.bulk(request, [course_id.strip() for course_id in course_ids.split(',') if course_id.strip()])
+
         # course_id to filter by
         course_id = request.GET.get('courseid', '')
 
@@ -166,21 +388,167 @@ class GetCourseDetails(View):
             return JsonResponse({"error" : "Invalid Course ID"})
 
         try:
-            course = Course.objects.get(course_id=course_id)
+            catalog = get_catalog()
+            course = catalog.get(int(course_id))
+        except ValueError:
+            course = None
+
+        if course is None:
+            return JsonResponse({"error" : "Invalid Course ID"})
+
+        return cacheable(JsonResponse(course_details(catalog, course)))
+
+    def post(self, request):
+        try:
+            course_ids = json.loads(request.body)["courseids"]
         except:
+            return JsonResponse({"error" : "invalid request"})
+
+        if not isinstance(course_ids, list):
+            return JsonResponse({"error" : "invalid request"})
+
+        return self.bulk(request, course_ids)
+
+    def bulk(self, request, course_ids):
+        """ Details of every course, keyed by course ID, all looked up in the catalog """
+        if len(course_ids) > settings.COURSE_DETAILS_MAX_IDS:
+            return JsonResponse({"error" : "too many course IDs"})
+
+        catalog = get_catalog()
+        courses = {}
+
+        for course_id in course_ids:
+            try:
+                course = catalog.get(int(course_id))
+            except (TypeError, ValueError):
+                course = None
+
+            if course is None:
+                courses[str(course_id)] = {"error" : "Invalid Course ID"}
+            else:
+                courses[str(course.course_id)] = course_details(catalog, course)
+
+        # every request asks for its own courses, the payload isn't cached
+        return payload_response(request, one_off_payload(request, {"courses": courses}))
+
+# Request:
+# /api/GetCourseRequirements?courseid=1234567 or ?courseid=1234567,7654321
+# optional calc_id (default 1), the calculator whose programs are returned
+# Returns the programs, and the requirement items in them, that every course counts toward
+class GetCourseRequirements(View):
+
+    def get(self, request):
+        try:
+            course_ids = [int(course_id) for course_id in request.GET.get('courseid', '').split(',')]
+        except ValueError:
             return JsonResponse({"error" : "Invalid Course ID"})
 
-        response_data = defaultdict(str)
+        try:
+            calc_id = request.GET.get('calc_id', '')
+            # the compiled plan knows the programs of every course, see plans.py
+            plan = get_calculator_plan(1 if calc_id == "" else calc_id)
+        except:
+            return JsonResponse({"error": "no such calc_id exists"})
+
+        catalog = get_catalog()
+        response_data = {
+                "courses": []
+        }
 
-        response_data["courseCode"] = course.code
-        response_data["courseName"] = course.name
-        response_data["courseDesc"] = course.desc
+        for course_id in course_ids:
+            course = catalog.get(course_id)
+            if course is None:
+                return JsonResponse({"error" : "Invalid Course ID"})
+
+            programs = []
+            bit = plan.index.get(course_id)
+            for p in (plan.course_programs[bit] if bit is not None else ()):
+                program = plan.programs[p]
+                programs.append({
+                        "programId": program.program_id,
+                        "programName": program.name,
+                        "requirements": [{
+                                "group": group,
+                                "item": position,
+                                "itemId": item.item_id,
+                                "units": item.units
+                        } for group, requirement in enumerate(program.groups)
+                          for position, item in enumerate(requirement.items) if item.mask >> bit & 1]
+                })
+
+            response_data["courses"].append({
+                    "courseID": course.course_id,
+                    "courseCode": course.code,
+                    "programs": programs
+            })
 
         return JsonResponse(response_data)
 
+def program_response(program, result, selection, include_tree=False):
+    """ One entry of matchedPrograms """
+    res = {
+            "programName" : program.name,
+            "programDescription" : program.desc,
+            "programId" : program.program_id,
+            "programPercentage" : percentage(result),
+            # equations are rendered when data is loaded, see equations.py
+            "programRequirements": {"requirements": [requirement.equation for requirement in program.groups]},
+            # return name of fulfilled courses
+            "fulfilledCourses": [selection.codes(fulfilled) for fulfilled in result.fulfilled]
+    }
+    if include_tree:
+        res["programRequirements"]["tree"] = list(program.equation_tree)
+
+    return res
+
+def solve_result(program, selection):
+    return solve_program(program, selection).result
+
+def match_programs(plan, selected_courses, strategy="greedy", include_tree=False, top_k=None, min_percentage=None):
+    """
+    Builds the SubmitCourseSelections response for one selection
+    With top_k or min_percentage only the programs that make the cut are returned, see ranking.py
+    """
+    response_json = {
+            "matchedPrograms" : [
+            ]
+    }
+
+    # requirements are compiled once per calculator, see plans.py
+    selection = Selection(plan, selected_courses)
+
+    # "greedy" uses courses in selection order, "optimal" searches for the best assignment
+    if top_k is not None or min_percentage is not None:
+        ranked, pruned = rank_programs(plan, selection, solve_result if strategy == "optimal" else evaluate_program, top_k, min_percentage)
+        programs = [plan.programs[p] for p, result in ranked]
+        results = [result for p, result in ranked]
+        response_json["prunedPrograms"] = pruned
+    elif strategy == "optimal":
+        programs = plan.programs
+        # programs without a selected course are at 0%, see CalculatorPlan.course_programs
+        touched = touched_programs(plan, selection)
+        results = [solve_result(program, selection) if p in touched else plan.untouched[p] for p, program in enumerate(plan.programs)]
+    else:
+        programs = plan.programs
+        results = score_calculator(plan, selection)
+
+    for program, result in zip(programs, results):
+        # append answer to our result
+        response_json["matchedPrograms"].append(program_response(program, result, selection, include_tree))
+
+    return response_json
+
 # /api/SubmitCourseSelections
 # send as a POST.
 # body should contain one key 'selections' with a value of an array of course IDs selected.
+# optional key 'strategy' can be "greedy" (default) or "optimal".
+# optional key 'include_tree', when true requirements are also returned as structured trees.
+# optional key 'top_k', only the top_k programs with the highest percentage are returned, best first.
+# optional key 'min_percentage', only programs with at least this percentage (0 to 1) are returned.
+# with either of them the response also has 'prunedPrograms', the number of programs skipped without being checked.
+# optional key 'audit', when true up to AUDIT_MAX_COURSES courses (a full transcript) are accepted
+# instead of 15, and the "greedy" strategy is always used.
+# responses are cached by each worker, the X-Cache header is HIT or MISS, see results.py
 # still in progress
 class SubmitCourseSelections(View):
 
@@ -192,160 +560,312 @@ class SubmitCourseSelections(View):
     def post(self, request):
         # get programs
         selected_courses = json.loads(request.body)["selections"]
-        if len(selected_courses) > 15:
+        audit = bool(json.loads(request.body).get("audit", False))
+        if len(selected_courses) > (settings.AUDIT_MAX_COURSES if audit else 15):
             return JsonResponse({"error" : "too many courses"})
 
         try:
             calc_id = json.loads(request.body)["calc_id"]
             if calc_id == "": # default to 1
-                programs = Calculator.objects.get(calculator_id=1).programs.all()
+                plan = get_calculator_plan(1)
             else:
-                programs = Calculator.objects.get(calculator_id=calc_id).programs.all()
+                plan = get_calculator_plan(calc_id)
         except:
             return JsonResponse({"error": "no such calc_id exists"})
 
-        response_json = {
-                "matchedPrograms" : [
-                ]
-        }
-
-        for program in programs:
-
-            # create our course list and counter
-            course_list = selected_courses.copy()
-            fulfilled_courses_id = []
+        body = json.loads(request.body)
 
-            total_completed_courses = total_required_courses = 0
-
-            # get all requirements
-            requirement_groups = program.requirements.all().order_by('order').prefetch_related('requirementitem_set')
+        try:
+            top_k = body.get("top_k")
+            if top_k is not None:
+                top_k = int(top_k)
+                if top_k < 1:
+                    raise ValueError()
+            min_percentage = body.get("min_percentage")
+            if min_percentage is not None:
+                min_percentage = float(min_percentage)
+                # also false for nan
+                if not 0 <= min_percentage <= 1:
+                    raise ValueError()
+        except (TypeError, ValueError):
+            return JsonResponse({"error" : "invalid top_k or min_percentage"})
+
+        strategy = body.get("strategy", "greedy")
+        if strategy not in STRATEGIES:
+            return JsonResponse({"error" : "invalid strategy"})
+        # the optimal search grows too quickly with a full transcript
+        if audit:
+            strategy = "greedy"
+        include_tree = bool(body.get("include_tree", False))
+
+        key = result_key(plan, Selection(plan, selected_courses), strategy, include_tree, top_k, min_percentage)
+        content = result_cache.get(key)
+        cache_status = "HIT"
+
+        if content is None:
+            content = json.dumps(match_programs(plan, selected_courses, strategy, include_tree, top_k, min_percentage))
+            result_cache.set(key, content)
+            cache_status = "MISS"
+
+        response = HttpResponse(content, content_type="application/json")
+        response["X-Cache"] = cache_status
+        return response
+
+def check_selection(selected_courses):
+    """ The error line of a selection set of a batch, None if it can be evaluated """
+    if not isinstance(selected_courses, list) or not all(isinstance(course, (int, str)) for course in selected_courses):
+        return {"error" : "selections must be a list of course IDs"}
+    if len(selected_courses) > 15:
+        return {"error" : "too many courses"}
+    return None
+
+# compiled plan of a batch worker process, set once when the worker starts
+_batch_plan = None
+
+def start_batch_worker(plan):
+    global _batch_plan
+    _batch_plan = plan
+
+def evaluate_in_worker(job):
+    """ One SubmitCourseSelections response, in a batch worker, against the plan it was given """
+    selected_courses, strategy = job
+    return match_programs(_batch_plan, selected_courses, strategy)
+
+def stream_batch(plan, jobs, errors, workers):
+    """
+    Yields one NDJSON line per selection set, in request order
+    errors has the error line of every selection set, None for those in jobs, checked before the response started
+    """
+    pool = None
+    if workers <= 1 or len(jobs) <= 1:
+        lines = (match_programs(plan, selected_courses, strategy) for selected_courses, strategy in jobs)
+    else:
+        # workers get the plan compiled here and never read the data version or query the database,
+        # the connections are closed first so no worker inherits one
+        connections.close_all()
+        pool = multiprocessing.get_context("fork").Pool(workers, initializer=start_batch_worker, initargs=(plan,))
+        lines = pool.imap(evaluate_in_worker, jobs, chunksize=max(1, len(jobs) // (workers * 4)))
+
+    try:
+        for error in errors:
+            yield json.dumps(error if error is not None else next(lines)) + "\n"
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+# /api/SubmitCourseSelectionsBatch
+# send as a POST.
+# body should contain 'calc_id' and 'selections', an array of arrays of course IDs.
+# optional keys: 'strategy' (as in SubmitCourseSelections) and 'workers', the number of processes to use.
+# responds with newline delimited JSON, one SubmitCourseSelections response per selection set, in order.
+class SubmitCourseSelectionsBatch(View):
 
-            for requirement in requirement_groups:
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        return super(SubmitCourseSelectionsBatch, self).dispatch(request, *args, **kwargs)
 
-                prev_course_list = set(course_list.copy())
+    def post(self, request):
+        try:
+            body = json.loads(request.body)
+            batch = body["selections"]
+            strategy = body.get("strategy", "greedy")
+            workers = int(body.get("workers", 1))
+        except:
+            return JsonResponse({"error" : "invalid request"})
 
-                requirement_items = requirement.requirementitem_set.all()
+        if not isinstance(batch, list):
+            return JsonResponse({"error" : "invalid request"})
+        if strategy not in STRATEGIES:
+            return JsonResponse({"error" : "invalid strategy"})
+        if len(batch) > settings.BATCH_MAX_SELECTIONS:
+            return JsonResponse({"error" : "too many selection sets"})
 
-                # TODO: merge == 1 and multi together - improvement
+        try:
+            calc_id = body["calc_id"]
+            if calc_id == "": # default to 1
+                calc_id = 1
+            # compiled once, before any worker is started
+            plan = get_calculator_plan(calc_id)
+        except:
+            return JsonResponse({"error": "no such calc_id exists"})
 
-                if len(requirement_items) == 1:
+        # bounded by the configured maximum and the cores available
+        if not hasattr(os, "fork"):
+            workers = 1
+        workers = max(1, min(workers, settings.BATCH_MAX_WORKERS, os.cpu_count() or 1))
 
-                    units = requirement_items[0].req_units
-                    check_list = list((requirement_items[0].req_list.courses.all().values_list('course_id', 'units')))
-                    check_list = (units, check_list)
+        # every selection set is checked before the response starts
+        errors = [check_selection(selected_courses) for selected_courses in batch]
+        jobs = [(selected_courses, strategy) for selected_courses, error in zip(batch, errors) if error is None]
 
-                    # apply calculations
-                    completed_courses, required_courses, course_list = self.calculate(check_list, course_list)
+        return StreamingHttpResponse(stream_batch(plan, jobs, errors, workers), content_type="application/x-ndjson")
 
-                    # update total counter
-                    total_completed_courses += completed_courses
-                    total_required_courses += required_courses
+# /api/EvaluationSession
+# send as a POST to open a session.
+# body should contain 'calc_id', optional keys 'selections' (the starting courses) and 'strategy'.
+# responds with the 'session' id and the SubmitCourseSelections response for the starting courses.
+# sessions are kept by the worker that opened them, the least recently used are closed first.
+class EvaluationSessionStart(View):
 
-                else:
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        return super(EvaluationSessionStart, self).dispatch(request, *args, **kwargs)
 
-                    build_requirements = []
+    def post(self, request):
+        try:
+            body = json.loads(request.body)
+            selected_courses = body.get("selections", [])
+            strategy = body.get("strategy", "greedy")
+            if not isinstance(selected_courses, list):
+                raise ValueError()
+        except:
+            return JsonResponse({"error" : "invalid request"})
 
-                    # We are converting a complex requirement_group
-                            # Ex. Group connector is OR
-                            #
-                            # -     |   3 units from List 1
-                            # AND   |   3 units from List 2
-                            # OR    |   3 units from List 3
-                            # AND   |   3 units from List 4
-                            #
-                            # This is converted to
-                            # output -> (3 units from L1 AND 3 units from L2) OR (3 units from L3 AND 3 units from L4)
+        try:
+            calc_id = body.get("calc_id", "")
+            session_id, session = open_session(1 if calc_id == "" else calc_id, selected_courses, strategy)
+        except SessionError as e:
+            return JsonResponse({"error" : str(e)})
+        except:
+            return JsonResponse({"error": "no such calc_id exists"})
 
-                    for i, item in enumerate(requirement_items):
-                            # We skip the connector for the first item
-                        if i != 0:
-                            build_requirements.append(item.connector)
+        response_data = {
+                "session": session_id,
+                "matchedPrograms": [program_response(program, result, session.selection)
+                        for program, result in zip(session.plan.programs, session.results)]
+        }
 
-                        units = item.req_units
-                        check_list = list((item.req_list.courses.all().values_list('course_id', 'units')))
-                        check_list = (units, check_list)
+        return JsonResponse(response_data)
 
-                        build_requirements.append(check_list)
+# /api/EvaluationSession/<session id>
+# send as a POST with 'changes', a list such as ["+123", "-456"] to add course 123 and remove course 456.
+# responds with 'updatedPrograms', the matchedPrograms entries of the programs the changes could affect.
+# send as a DELETE to close the session.
+class EvaluationSessionChange(View):
 
-                    # Now we build a parse tree
-                    # Parser takes in a precedence which is opposite of connector
-                    #        -> mosaic's connector is the opposite of the precedence
-                    # This will output something like
-                        # -> (3 units from L1 AND 3 units from L2) OR (3 units from L3 AND 3 units from L4)
-                    check_list = Parser(build_requirements, not requirement.connector).parse()
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        return super(EvaluationSessionChange, self).dispatch(request, *args, **kwargs)
 
-                    # apply calculations
-                    completed_courses, required_courses, course_list = self.calculate(check_list, course_list)
-                    # update total counter
-                    total_completed_courses += completed_courses
-                    total_required_courses += required_courses
+    def post(self, request, session_id):
+        session = get_session(session_id)
+        if session is None:
+            return JsonResponse({"error" : "no such session"})
 
-                fulfilled_courses_id.append(list(prev_course_list - set(course_list)))
+        try:
+            changes = json.loads(request.body)["changes"]
+            if not isinstance(changes, list):
+                raise ValueError()
+        except:
+            return JsonResponse({"error" : "invalid request"})
 
+        try:
+            updated = session.apply(changes)
+        except SessionError as e:
+            return JsonResponse({"error" : str(e)})
+        except ObjectDoesNotExist:
+            close_session(session_id)
+            return JsonResponse({"error": "no such calc_id exists"})
 
-            # return name of fulfilled courses
-            fulfilled_courses_name = []
+        response_data = {
+                "session": session_id,
+                "selections": session.selected,
+                "updatedPrograms": [program_response(session.plan.programs[p], session.results[p], session.selection) for p in updated]
+        }
 
-            for courses in fulfilled_courses_id:
-                fulfilled_courses_name.append([Course.objects.get(course_id=course).code for course in courses])
+        return JsonResponse(response_data)
 
-            # append answer to our result
-            res = {
-                    "programName" : program.name,
-                    "programDescription" : program.desc,
-                    "programId" : program.program_id,
-                    "programPercentage" :  round(total_completed_courses / total_required_courses, 2) if total_required_courses != 0 else 0,
-                    "programRequirements": program.requirement_equation(),
-                    "fulfilledCourses": fulfilled_courses_name
-            }
-            response_json["matchedPrograms"].append(res)
+    def delete(self, request, session_id):
+        return JsonResponse({"closed": close_session(session_id)})
 
-        return JsonResponse(response_json)
+# /api/ResultCacheStats
+# hit/miss counters of the SubmitCourseSelections cache of the worker that answers
+class ResultCacheStats(View):
 
-    def calculate(self, tree, course_list):
+    def get(self, request):
+        return JsonResponse(result_cache.stats())
 
-        # base case
-        if not isinstance(tree, BinOp):
-            units, check_list = tree
-            req_units = units
-            # convert check_list to set for const lookup
-            units_for_course = dict(check_list)
+# /api/SuggestCourses
+# send as a POST.
+# body should contain 'calc_id' and 'selections', the courses selected so far.
+# optional keys: 'limit', the number of suggestions (default 10) and 'program_ids', to only consider some programs.
+# responds with the courses that raise a program's percentage the most when added,
+# overall ('suggestions') and per program ('programs').
+# 'complete' is false when SUGGEST_TIME_LIMIT ran out before every course was tried.
+class SuggestCourses(View):
 
-            check_list = set(units_for_course.keys())
+    @method_decorator(csrf_exempt)
+    def dispatch(self, request, *args, **kwargs):
+        return super(SuggestCourses, self).dispatch(request, *args, **kwargs)
 
-            new_course_list = course_list.copy()
+    def post(self, request):
+        try:
+            body = json.loads(request.body)
+            selected_courses = body["selections"]
+            limit = min(int(body.get("limit", 10)), settings.SUGGEST_MAX_RESULTS)
+            if not isinstance(selected_courses, list) or limit < 1:
+                raise ValueError()
+            # when given, a list of program IDs
+            program_ids = None
+            if "program_ids" in body:
+                program_ids = body["program_ids"]
+                if not isinstance(program_ids, list) or not all(type(program_id) is int for program_id in program_ids):
+                    raise ValueError()
+                program_ids = set(program_ids)
+        except:
+            return JsonResponse({"error" : "invalid request"})
 
-            for course in course_list:
-                if course in check_list:
-                    units -= units_for_course[course]
-                    # course_list is still a list to maintain ordering
-                    new_course_list.remove(course)
-                    if units == 0:
-                        break
+        if len(selected_courses) >= 15:
+            return JsonResponse({"error" : "too many courses"})
 
-            course_list = new_course_list
+        try:
+            calc_id = body.get("calc_id", "")
+            plan = get_calculator_plan(1 if calc_id == "" else calc_id)
+        except:
+            return JsonResponse({"error": "no such calc_id exists"})
 
-            if units == 0:
-                return req_units, req_units, course_list
-            else:
-                return req_units - units, req_units, course_list
+        programs = None
+        if program_ids is not None:
+            programs = {p for p, program in enumerate(plan.programs) if program.program_id in program_ids}
+
+        found, complete = suggest_courses(plan, selected_courses, settings.SUGGEST_TIME_LIMIT, programs)
+
+        # best gain of every course, ties go to the course that helps the most programs
+        best = {}
+        for suggestion in found:
+            gain, total, count, top = best.get(suggestion.bit, (0, 0, 0, None))
+            if suggestion.gain > gain:
+                top = suggestion
+            best[suggestion.bit] = (max(gain, suggestion.gain), total + suggestion.gain, count + 1, top)
+
+        overall = sorted(best.items(), key=lambda entry: (-entry[1][0], -entry[1][1], entry[0]))[:limit]
+
+        by_program = {}
+        for suggestion in sorted(found, key=lambda s: (-s.gain, s.bit)):
+            by_program.setdefault(suggestion.program, [])
+            if len(by_program[suggestion.program]) < limit:
+                by_program[suggestion.program].append({
+                        "courseID": plan.course_ids[suggestion.bit],
+                        "courseCode": plan.codes[suggestion.bit],
+                        "gain": suggestion.gain,
+                        "programPercentage": suggestion.percentage
+                })
 
-        if tree.op == AND:
-            left_completed_courses, left_required_coures, left_course_list = self.calculate(tree.left, course_list)
-            # Since we have an AND, we use the updated course_list from the left
-            right_completed_courses, right_required_courses, right_course_list = self.calculate(tree.right, left_course_list)
+        response_data = {
+                "suggestions": [{
+                        "courseID": plan.course_ids[bit],
+                        "courseCode": plan.codes[bit],
+                        "bestGain": gain,
+                        "bestProgramId": plan.programs[top.program].program_id,
+                        "totalGain": round(total, 2),
+                        "programsImproved": count
+                } for bit, (gain, total, count, top) in overall],
+                "programs": [{
+                        "programId": plan.programs[p].program_id,
+                        "programName": plan.programs[p].name,
+                        "suggestions": suggestions
+                } for p, suggestions in sorted(by_program.items())],
+                "complete": complete
+        }
 
-            return (left_completed_courses + right_completed_courses), (left_required_coures + right_required_courses), right_course_list
-        else:
-            # OR case
-            # Keep a copy to prevent aliasing
-            course_list_copy = course_list.copy()
-            left_completed_courses, left_required_coures, left_course_list = self.calculate(tree.left, course_list)
-            # Since we have an AND, we use the updated course_list from the left
-            right_completed_courses, right_required_courses, right_course_list = self.calculate(tree.right, course_list_copy)
-
-            # if left side of equation is True, we propogate that up
-            if left_completed_courses == left_required_coures or ((left_required_coures - left_completed_courses) < (right_required_courses - right_completed_courses)):
-                return left_completed_courses, left_required_coures, left_course_list
-            else:
-                return right_completed_courses, right_required_courses, right_course_list
+        return JsonResponse(response_data)